@@ -3,27 +3,128 @@ import xutils
 import contextlib
 import traceback
 import inspect
+import operator
+import collections
 
 def isSubClass(cls, basecls):
     assert isinstance(basecls, ClassDef), (cls, basecls)
     if not isinstance(cls, ClassDef):
         return False
-    if cls is basecls:
-        return True
-    for b in cls.bases:
-        bcls = b.getTarget()
-        if isSubClass(bcls, basecls):
-            return True
-    return False
+    return basecls in classHierarchy.getEntry(cls).depths
+
+class ClassHierarchyEntry(object):
+    def __init__(self, cls):
+        self.cls = cls
+        # the class and all its ancestors with the length of the shortest base chain to them
+        self.depths = {cls : 0}
+        # memoized findMember/findLocalSymbol results, misses included
+        self.members = {}
+        self.localSymbols = {}
+        self.complete = True
+        depth = 0
+        layer = [cls]
+        while len(layer) > 0:
+            depth += 1
+            nextLayer = []
+            for c in layer:
+                for b in c.bases:
+                    bcls = b.getTarget()
+                    if bcls is None:
+                        # base not resolved yet
+                        self.complete = False
+                    elif bcls not in self.depths:
+                        self.depths[bcls] = depth
+                        nextLayer.append(bcls)
+            layer = nextLayer
+
+class ClassHierarchy(object):
+    '''
+    index of the class graph kept by the project, entries are built on demand and dropped
+    whenever a class is resolved or instantiated or a class gets a new member.
+    '''
+    def __init__(self):
+        self.entries = {}
+    def invalidate(self, basesChanged=True):
+        self.entries = {}
+        if basesChanged:
+            # bases decide where names are found, a new member only affects the cached lookups of its own name
+            invalidateSymbolCaches()
+    def getEntry(self, cls):
+        entry = self.entries.get(cls)
+        if entry is None:
+            entry = ClassHierarchyEntry(cls)
+            if entry.complete:
+                self.entries[cls] = entry
+        return entry
+
+classHierarchy = ClassHierarchy()
+
+class AstFields(object):
+    # the child fields of a node class, i.e. its constructor arguments, with a getter fetching all of them at once
+    __slots__ = ('names', 'getValues')
+    def __init__(self, names):
+        self.names = names
+        if len(names) > 1:
+            self.getValues = operator.attrgetter(*names)
+        elif names:
+            name = names[0]
+            self.getValues = lambda node: (getattr(node, name),)
+        else:
+            self.getValues = lambda node: ()
+
+astFieldsCache = {}
+
+def getAstFields(cls):
+    fields = astFieldsCache.get(cls)
+    if fields is None:
+        argspec = inspect.getargspec(cls.__init__)
+        assert argspec.args[0] == 'self', (cls, argspec)
+        fields = AstFields(argspec.args[1:])
+        astFieldsCache[cls] = fields
+    return fields
+
+# results of the getOwnerXXX queries are cached per node as [generation, func, class, unit, closure, block context, full context],
+# re-parenting a node bumps the generation which drops all of them
+ownerGeneration = 0
+ownerMissing = object()
+ownerFuncIndex, ownerClassIndex, ownerUnitIndex, ownerClosureIndex, ownerBlockContextIndex, ownerFullContextIndex = range(1, 7)
+
+def invalidateOwnerCaches():
+    global ownerGeneration
+    ownerGeneration += 1
+
+# symbols found in the enclosing scopes are cached per scope, see AstBlockContext.findSymbol. re-parenting a node
+# or changing the class graph drops all of them, adding a symbol only drops the entries with its name.
+symbolGeneration = 0
+symbolNameGenerations = {}
+
+def invalidateSymbolCaches():
+    global symbolGeneration
+    symbolGeneration += 1
+
+def invalidateSymbolName(name):
+    symbolNameGenerations[name] = symbolNameGenerations.get(name, 0) + 1
+
+# clones made by ClassDef.instantiate and AstNode.setupType and the reuses that avoided one, reported by the census
+cloneCounts = collections.Counter()
+instantiatedClasses = collections.Counter()
 
 class AstSimpleContext(object):
+    # the hot node classes below declare their attributes as slots too, AstNode keeps a __dict__ for
+    # everything else so rarely used attributes still work and only cost a dict when they are set
+    __slots__ = ('owner', 'astFieldNames', 'ownerCache')
     def __init__(self):
         self.owner = None
         self.astFieldNames = None
+        self.ownerCache = None
     def getOwner(self):
         return self.owner
     def setOwner(self, owner):
         assert owner, (self, self.owner)
+        if self.owner is not None and self.owner is not owner:
+            # a subtree is moved, the owner chains and symbols cached anywhere below it are stale now
+            invalidateOwnerCaches()
+            invalidateSymbolCaches()
         self.owner = owner
     def addSymbol(self, symbol):
         assert False, (self, symbol, self.owner, self.getOwnerFunc(), self.getOwnerClass())
@@ -40,32 +141,51 @@ class AstSimpleContext(object):
         if isinstance(self, FuncDef) or isinstance(self, FuncProto) or isinstance(self, LibFuncBase):
             return self
         # assert self.owner, self
-        return self.owner.getOwnerFunc() if self.owner else None
+        return self.findCachedOwner(ownerFuncIndex, 'getOwnerFunc')
     def getOwnerClass(self):
         # assert self.owner, self
         if isinstance(self, ClassDef) or isinstance(self, LibClassBase):
             return self
-        return self.owner.getOwnerClass() if self.owner else None
+        return self.findCachedOwner(ownerClassIndex, 'getOwnerClass')
     def getOwnerUnit(self):
         assert self.owner, self
         if isinstance(self, CodeUnit):
             return self
-        return self.owner.getOwnerUnit() if self.owner else None
+        return self.findCachedOwner(ownerUnitIndex, 'getOwnerUnit')
     def getOwnerClosure(self):
         assert self.owner, self
         if isinstance(self, Closure):
             return self
-        return self.owner.getOwnerClosure() if self.owner else None
+        return self.findCachedOwner(ownerClosureIndex, 'getOwnerClosure')
     def getOwnerBlockContext(self):
         assert self.owner, self
         if isinstance(self, AstBlockContext):
             return self
-        return self.owner.getOwnerBlockContext() if self.owner else None
+        return self.findCachedOwner(ownerBlockContextIndex, 'getOwnerBlockContext')
     def getOwnerFullContext(self):
         assert self.owner, self
         if isinstance(self, AstFullContext):
             return self
-        return self.owner.getOwnerFullContext() if self.owner else None
+        return self.findCachedOwner(ownerFullContextIndex, 'getOwnerFullContext')
+    def findCachedOwner(self, index, query):
+        owner = self.owner
+        if owner is None:
+            return None
+        cache = self.ownerCache
+        if cache is None or cache[0] != ownerGeneration:
+            cache = self.ownerCache = [ownerGeneration, ownerMissing, ownerMissing, ownerMissing, ownerMissing, ownerMissing, ownerMissing]
+        else:
+            ret = cache[index]
+            if ret is not ownerMissing:
+                return ret
+        ret = getattr(owner, query)()
+        # a miss is only final when the chain above cannot change any more: units sit right below the packages
+        if ret is not None or isinstance(owner, (CodeUnit, LibUnit)) or owner.hasFinalOwnerMiss(index):
+            cache[index] = ret
+        return ret
+    def hasFinalOwnerMiss(self, index):
+        cache = self.ownerCache
+        return cache is not None and cache[0] == ownerGeneration and cache[index] is None
     def resolveSymbol(self, path):
         if self.owner is None:
             # print('AstSimpleContext.resolveSymbol top', path, self)
@@ -76,9 +196,13 @@ class AstSimpleContext(object):
 
 
 class AstBlockContext(AstSimpleContext):
+    # only classes and units (full contexts) keep a symbol cache: most lookups end up there, inner blocks would
+    # mostly miss, and none of them sits below a case entry whose lookups change with its pattern
+    cachesSymbols = False
     def __init__(self):
         AstSimpleContext.__init__(self)
         self.symbols = {}
+        self.symbolCache = None
     def hasSymbol(self, name):
         return name in self.symbols
     def findMember(self, name):
@@ -100,6 +224,9 @@ class AstBlockContext(AstSimpleContext):
         assert node.name not in self.symbols, (node.name, node, self, self.symbols)
         self.symbols[node.name] = node
         assert node.name in self.symbols and self.symbols[node.name], (node.name, node, self, self.symbols)
+        invalidateSymbolName(node.name)
+        if isinstance(self, (ClassDef, LibClassBase)):
+            classHierarchy.invalidate(False)
         if isinstance(self, (CodeUnit, LibUnit)):
             if not self.pkg.hasSymbol(node.name):
                 # print('AstBlockContext.addSymbol to pkg', node.name, node, self, self.owner, self.pkg)
@@ -124,7 +251,21 @@ class AstBlockContext(AstSimpleContext):
             # print('findSymbol failed:', name, self)
             return None
         # print('AstBlockContext.findSymbol in owner:', name, self, self.owner, self.symbols)
-        return self.owner.findSymbol(name)
+        if not self.cachesSymbols:
+            return self.owner.findSymbol(name)
+        cache = self.symbolCache
+        if cache is None or cache[0] != symbolGeneration:
+            cache = self.symbolCache = (symbolGeneration, {})
+        cache = cache[1]
+        generation = symbolNameGenerations.get(name, 0)
+        entry = cache.get(name)
+        if entry is not None and entry[1] == generation:
+            return entry[0]
+        node = self.owner.findSymbol(name)
+        # only hits are kept, a miss may still be filled by a scope that is attached later
+        if node is not None:
+            cache[name] = (node, generation)
+        return node
     def eachSymbol(self, f):
         for k, v in self.symbols.iteritems():
             f(k, v)
@@ -132,6 +273,7 @@ class AstBlockContext(AstSimpleContext):
         self.addSymbol(var)
 
 class AstFullContext(AstBlockContext):
+    cachesSymbols = True
     def __init__(self):
         AstBlockContext.__init__(self)
         self.definitions = []
@@ -154,6 +296,8 @@ class AstFullContext(AstBlockContext):
         self.vars.append(var)
 
 class AstVisitor(object):
+    # nodes entered through AstNode.visit, reported by the phase metrics
+    visitedNodes = 0
     def __init__(self):
         self.fullContexts = []
         self.blockContexts = []
@@ -164,7 +308,7 @@ class AstVisitor(object):
     def popFullContext(self, context):
         del self.conetxts[0]
     def previsit(self, node):
-        pass
+        self.visitedNodes += 1
     def getOwnerUnit(self):
         #return getOwnerUnit(owner)
         return self.ast
@@ -172,29 +316,33 @@ class AstVisitor(object):
         return self.contexts[0]
     def autoVisit(self, node, func):
         # self.logger.debug('AstVisitor.autoVisit', node, self, node.owner, node.getOwnerFunc(), node.getOwnerClass())
-        node.checkAstFieldNames()
-        for argname in node.astFieldNames:
-            # assert hasattr(node, argname), (node, argname)
-            field = getattr(node, argname)
-            # self.logger.debug('AstVisitor.autoVisit field', argname, field, node, self, node.getOwnerFunc())
-            self.autoVisitField(argname, field, node, func)
+        for name, field in zip(node.getAstFieldNames(), node.getAstFieldValues()):
+            # self.logger.debug('AstVisitor.autoVisit field', name, field, node, self, node.getOwnerFunc())
+            if isinstance(field, AstNode):
+                func(field, node)
+            elif field is not None:
+                self.autoVisitField(name, field, node, func)
     def autoVisitField(self, name, field, node, func):
         # self.logger.debug('AstVisitor.autoVisitField', field, node, self)
-        if isinstance(field, list):
+        if isinstance(field, AstNode):
+            # self.logger.debug('AstVisitor.autoVisitField node', field, node, self, func)
+            func(field, node)
+        elif isinstance(field, list):
             # self.logger.debug('AstVisitor.autoVisitField list', field, node, self)
+            # visiting may add definitions to the very list being walked, so it is still copied
             for x in field[:]:
-                self.autoVisitField(name, x, node, func)
+                if isinstance(x, AstNode):
+                    func(x, node)
+                else:
+                    self.autoVisitField(name, x, node, func)
         elif isinstance(field, dict):
             # self.logger.debug('AstVisitor.autoVisitField dict', field, node, self)
             for key, val in field.iteritems():
                 self.autoVisitField(name, key, node, func)
                 self.autoVisitField(name, val, node, func)
         elif isinstance(field, tuple):
-            for x in list(field):
+            for x in field:
                 self.autoVisitField(name, x, node, func)
-        elif isinstance(field, AstNode):
-            # self.logger.debug('AstVisitor.autoVisitField node', field, node, self, func)
-            func(field, node)
         else:
             # self.logger.debug('AstVisitor.autoVisitField extra', field, node, self)
             assert isinstance(field, str) or isinstance(field, int) or isinstance(field, float) or isinstance(field, xutils.EnumItem) or field is None, (name, node, field, type(field), node.getOwnerFunc())
@@ -240,30 +388,29 @@ class AstNode(object):
     def visit(self, visitor, *args):
         # print('AstNode.visit', self, visitor)
         visitor.previsit(self)
-        # try internal `opname` method first
-        func = getattr(self, visitor.opname, None)
-        if func:
-            ret = func(visitor, *args)
-            if ret != passthrough:
+        handlers = visitDispatchTable.get((visitor.__class__, visitor.opname, self.__class__))
+        if handlers is None:
+            handlers = makeVisitHandlers(visitor.__class__, visitor.opname, self.__class__)
+        for func, internal in handlers:
+            ret = func(self, visitor, *args) if internal else func(visitor, self, *args)
+            if ret is not passthrough:
                 return ret
-        # try external visit function
-        ret = self.tryVisitExternal(self.__class__, visitor, *args)
-        if ret != passthrough:
-            return ret
         return self.visitDefault(visitor, *args)
-    def tryVisitExternal(self, cls, visitor, *args):
-        attrname = visitor.opname + '_' + cls.__name__
-        # print('tryVisitExternal invoke', self, attrname)
-        func = getattr(visitor, attrname, None)
-        if func:
-            ret = func(self, *args)
-            if ret != passthrough:
-                return ret
-        for basecls in cls.__bases__:
-            ret = self.tryVisitExternal(basecls, visitor, *args)
-            if ret != passthrough:
+    def countingVisit(self, visitor, *args):
+        # AstNode.visit while dispatch counting is enabled
+        visitor.previsit(self)
+        key = (visitor.__class__, visitor.opname, self.__class__)
+        handlers = visitDispatchTable.get(key)
+        if handlers is None:
+            handlers = makeVisitHandlers(*key)
+        counts = dispatchCounter.counts
+        for (func, internal), path in zip(handlers, visitHandlerPaths[key]):
+            ret = func(self, visitor, *args) if internal else func(visitor, self, *args)
+            if ret is not passthrough:
+                counts[(visitor.opname, self.__class__.__name__, path)] += 1
                 return ret
-        return passthrough
+        counts[(visitor.opname, self.__class__.__name__, 'default')] += 1
+        return self.visitDefault(visitor, *args)
     def visitDefault(self, visitor, *args):
         # print('AstNode.do_visit', visitor, args, self)
         self.visitChildren(visitor)
@@ -271,20 +418,18 @@ class AstNode(object):
         # print('AstNode.doVisitChildren', self, visitor)
         visitor.autoVisit(self, lambda node, owner: node.visit(visitor))
     def tryInvoke(self, name, cls, *args):
-        attrname = name + '_' + cls.__name__
-        # print('invoke', self, name, attrname, strategy, args, len(args))
-        func = getattr(args[0], attrname, None)
+        func = invokeDispatchTable.get((args[0].__class__, name, cls), passthrough)
+        if func is passthrough:
+            func = makeInvokeHandler(args[0].__class__, name, cls)
         if func:
-            return func(self, *args[1:]), True
-        for basecls in cls.__bases__:
-            ret, ok = self.tryInvoke(name, basecls, *args)
-            if ok:
-                return ret, ok
+            return func(args[0], self, *args[1:]), True
         return None, False
     def invoke(self, name, strategy, *args):
-        ret, ok = self.tryInvoke(name, self.__class__, *args)
-        if ok:
-            return ret
+        func = invokeDispatchTable.get((args[0].__class__, name, self.__class__), passthrough)
+        if func is passthrough:
+            func = makeInvokeHandler(args[0].__class__, name, self.__class__)
+        if func:
+            return func(args[0], self, *args[1:])
         # print('---------------------- invoke default', self, name, args)
         if strategy == AstNode.RETURN_ORGINAL:
             return self
@@ -310,41 +455,49 @@ class AstNode(object):
             assert False, (self, t)
             return
         assert self.type is None, (self, self.type, t, visitor)
+        key = getTypeKey(t)
+        internedTypes = visitor.project.internedTypes
+        if key in internedTypes:
+            cloneCounts['AstNode.setupType interned'] += 1
+            self.type = internedTypes[key]
+            return
+        cloneCounts['AstNode.setupType'] += 1
         t2 = t.clone()
         self.type = t2
         visitor.setupNewItem(self.type, self, True)
-    def checkAstFieldNames(self):
+        if key is not None and getTypeKey(t2) == key:
+            t2.interned = True
+            internedTypes[key] = t2
+    def getAstFieldNames(self):
+        return getAstFields(type(self)).names if self.astFieldNames is None else self.astFieldNames
+    def getAstFieldValues(self):
+        # astFieldNames is only set by the few nodes that narrow their fields, all others use the class getter
         if self.astFieldNames is None:
-            argspec = inspect.getargspec(self.__init__)
-            assert argspec.args[0] == 'self', (self, argspec)
-            self.astFieldNames = argspec.args[1:]
+            return getAstFields(type(self)).getValues(self)
+        return [getattr(self, argname) for argname in self.astFieldNames]
     def clone(self):
         # print('AstNode.clone', self)
-        self.checkAstFieldNames()
-        fields = []
-        for argname in self.astFieldNames:
-            # assert hasattr(node, argname), (node, argname)
-            field = getattr(self, argname)
-            # print('AstNode.clone field', argname, field, self)
-            fields.append(self.cloneField(field))
+        fields = [self.cloneField(field) for field in self.getAstFieldValues()]
         # print('AstNode.clone before result', self, type(self), fields)
         ret = type(self)(*fields)
         # print('AstNode.clone result', self, type(self), fields, ret)
         return ret
     def cloneField(self, field):
         # print('AstNode.cloneField', field, self)
-        if isinstance(field, list):
+        if isinstance(field, AstNode):
+            # print('AstNode.cloneField node', field, self)
+            return field.clone()
+        elif isinstance(field, list):
             # print('AstNode.cloneField list', field, self)
-            return [self.cloneField(x) for x in field]
+            return [x.clone() if isinstance(x, AstNode) else self.cloneField(x) for x in field]
         elif isinstance(field, dict):
             # print('AstNode.cloneField dict', field, self)
             return dict([(key, self.cloneField(val)) for key, val in field.iteritems()])
-        elif isinstance(field, AstNode):
-            # print('AstNode.cloneField node', field, self)
-            return field.clone()
+        elif isinstance(field, tuple):
+            return tuple([self.cloneField(x) for x in field])
         else:
             # print('AstVisitor.cloneField extra', field, node, self)
-            assert isinstance(field, str) or isinstance(field, int) or field is None, (node, field)
+            assert isinstance(field, str) or isinstance(field, int) or field is None, (self, field)
             return field
     def setExpectedType(self, expectedType):
         # assert expectedType, self
@@ -423,6 +576,82 @@ class CodeUnit(AstNode, AstFullContext):
                 visitor.setupNewItem(imp, self, False)
 
 
+# handler chains resolved once per (visitor class, opname, node class)
+visitDispatchTable = {}
+invokeDispatchTable = {}
+# dispatch path of every handler in visitDispatchTable: internal, external or base <inheritance depth>
+visitHandlerPaths = {}
+
+def collectExternalHandlers(visitorcls, opname, cls, handlers, paths, depth=0):
+    func = getattr(visitorcls, opname + '_' + cls.__name__, None)
+    if func:
+        handlers.append((getattr(func, 'im_func', func), False))
+        paths.append('base %d' % depth if depth else 'external')
+    for basecls in cls.__bases__:
+        collectExternalHandlers(visitorcls, opname, basecls, handlers, paths, depth + 1)
+
+def makeVisitHandlers(visitorcls, opname, cls):
+    # internal `opname` method first, then the external visit functions in base class order
+    handlers = []
+    paths = []
+    func = getattr(cls, opname, None)
+    if func:
+        handlers.append((getattr(func, 'im_func', func), True))
+        paths.append('internal')
+    collectExternalHandlers(visitorcls, opname, cls, handlers, paths)
+    handlers = tuple(handlers)
+    visitDispatchTable[(visitorcls, opname, cls)] = handlers
+    visitHandlerPaths[(visitorcls, opname, cls)] = tuple(paths)
+    return handlers
+
+class DispatchCounter(object):
+    '''
+    visits per visitor opname, node class and the dispatch path that handled them, with the
+    dispatch cache hits of the interpreter, printed at exit when --count-dispatch is given.
+    '''
+    def __init__(self):
+        # (opname, node class name or interpreter cache, path) -> count
+        self.counts = collections.Counter()
+    def count(self, opname, name, path):
+        self.counts[(opname, name, path)] += 1
+    def getTotals(self, index):
+        totals = collections.Counter()
+        for key, count in self.counts.iteritems():
+            totals[key[index]] += count
+        return totals
+    def dump(self, limit=50):
+        print('dispatch counts total=%d' % sum(self.counts.itervalues()))
+        for title, index in [('opname', 0), ('node class or cache', 1), ('path', 2)]:
+            print('  per %s' % title)
+            for name, count in self.getTotals(index).most_common(limit):
+                print('    %-40s %d' % (name, count))
+        print('  per opname, node class or cache and path')
+        for (opname, name, path), count in self.counts.most_common(limit):
+            print('    %-20s %-30s %-12s %d' % (opname, name, path, count))
+
+dispatchCounter = None
+
+def enableDispatchCounting():
+    global dispatchCounter
+    dispatchCounter = DispatchCounter()
+    AstNode.visit = AstNode.countingVisit.im_func
+    return dispatchCounter
+
+def findInvokeHandler(visitorcls, name, cls):
+    func = getattr(visitorcls, name + '_' + cls.__name__, None)
+    if func:
+        return getattr(func, 'im_func', func)
+    for basecls in cls.__bases__:
+        func = findInvokeHandler(visitorcls, name, basecls)
+        if func:
+            return func
+    return None
+
+def makeInvokeHandler(visitorcls, name, cls):
+    func = findInvokeHandler(visitorcls, name, cls)
+    invokeDispatchTable[(visitorcls, name, cls)] = func
+    return func
+
 def makeHandlerFunc(cmd, tag = AstNode.RETURN_NONE):
     func = lambda item, handler, *args : item.invoke(cmd, tag, handler, *args)
     return func
@@ -522,13 +751,35 @@ class Package(BlockNode):
             path = self.path
         self.name = path[len(path)-1] if path else ''
         self.packages = {}
+        # fully qualified package paths and symbol paths, only filled on the root package
+        self.packageIndex = {}
+        self.resolveIndex = (symbolGeneration, {})
     def findMember(self, name):
         # print('Package.findMember', self, name, self.owner, self.symbols)
         return self.findLocalSymbol(name)
+    def resolveSymbol(self, path):
+        if self is not Package.rootPackage:
+            return BlockNode.resolveSymbol(self, path)
+        generation, index = self.resolveIndex
+        if generation != symbolGeneration:
+            index = {}
+            self.resolveIndex = (symbolGeneration, index)
+        key = tuple(path)
+        generations = tuple([symbolNameGenerations.get(name, 0) for name in path])
+        entry = index.get(key)
+        if entry is not None and entry[1] == generations:
+            return entry[0]
+        node = BlockNode.resolveSymbol(self, path)
+        if node is not None:
+            index[key] = (node, generations)
+        return node
     def getPackage(self, path):
         # print('Package.getPackage0', self.path, path, formatId(self))
         assert isinstance(path, list) or isinstance(path, str), path
         if isinstance(path, str):
+            pkg = Package.rootPackage.packageIndex.get(self.fullpath + '.' + path if self.fullpath and path else self.fullpath or path)
+            if pkg is not None:
+                return pkg
             path = path.split('.') if path else []
         #assert len(self.path) > 0 or len(path) > 0, (self.path, path)
         if len(path) == 0:
@@ -541,6 +792,7 @@ class Package(BlockNode):
             # print('Package.getPackage create_child', self.path, path, formatId(self), self.packages)
             pkg = self.createChild(self.path + [path[0]])
             pkg.setOwner(self)
+            Package.rootPackage.packageIndex[pkg.fullpath] = pkg
             # print('Package.getPackage create_child ok', self.path, pkg.path, path, formatId(self), formatId(pkg), self.packages, self.symbols)
             assert name not in self.symbols
             self.addSymbol(pkg)
@@ -601,6 +853,7 @@ class Expression(AstNode):
         return self.getType().getTypeClass()
 
 class SimpleExpression(Expression, AstSimpleContext):
+    __slots__ = ('expectedType',)
     def __init__(self):
         Expression.__init__(self)
         AstSimpleContext.__init__(self)
@@ -648,6 +901,7 @@ class Type(SimpleExpression):
             visitor.setupNewItem(self.typeClass, self, True)
 
 class Literal(SimpleExpression):
+    __slots__ = ('type',)
     def __init__(self):
         SimpleExpression.__init__(self)
         self.type = None
@@ -749,7 +1003,7 @@ class CaseClassDef(Definition, AstFullContext):
         pass
 
 def isSameType(x, y):
-    return x.getTypeClass() == y.getTypeClass()
+    return x is y or x.getTypeClass() == y.getTypeClass()
 
 def checkGenericArgsCompatible(genericParams, genericArgs):
     assert len(genericParams) == len(genericArgs), (genericParams, genericArgs)
@@ -773,10 +1027,32 @@ def checkGenericArgsCompatible(genericParams, genericArgs):
             assert isinstance(param, GenericLiteralParam) and isinstance(arg, GenericLiteralArg), (param, arg)
             assert isSameType(param.type, arg.literal.getType()), (param, arg, param.type, arg.literal)
 
+def getGenericArgsKey(genericArgs):
+    # hashable identity of resolved generic args, None while any of the types is not resolved
+    key = []
+    for arg in genericArgs:
+        if isinstance(arg, GenericTypeArg):
+            typeClass = arg.type.getTypeClass()
+            if typeClass is None:
+                return None
+            key.append(typeClass)
+        elif isinstance(arg, GenericVariadicTypeArg):
+            typeClasses = tuple([t.getTypeClass() for t in arg.types])
+            if None in typeClasses:
+                return None
+            key.append(typeClasses)
+        else:
+            assert isinstance(arg, GenericLiteralArg), arg
+            key.append(('literal', arg.literal.value))
+    return tuple(key)
+
 class GenericInstantiator(object):
     def __init__(self, genericParams):
         self.genericParams = genericParams
         self.classes = []
+        # instantiations by getGenericArgsKey, the ones with unresolved args wait in pending
+        self.index = {}
+        self.pending = []
     def getRealArgs(self, genericArgs):
         # print('GenericInstantiator.getRealArgs', self.genericParams, genericArgs)
         realGenericArgs = []
@@ -801,12 +1077,27 @@ class GenericInstantiator(object):
         return realGenericArgs
     def find(self, genericArgs):
         checkGenericArgsCompatible(self.genericParams, genericArgs)
+        if self.pending:
+            pending = self.pending
+            self.pending = []
+            for cls in pending:
+                self.addIndex(cls)
+        key = getGenericArgsKey(genericArgs)
+        if key is not None:
+            return self.index.get(key)
         for cls in self.classes:
             if self.checkMatch(cls.instantiation.genericArgs, genericArgs):
                 return cls
         return None
     def cache(self, cls):
         self.classes.append(cls)
+        self.addIndex(cls)
+    def addIndex(self, cls):
+        key = getGenericArgsKey(cls.instantiation.genericArgs)
+        if key is None:
+            self.pending.append(cls)
+        elif key not in self.index:
+            self.index[key] = cls
     def isValidType(self, t):
         return isinstance(t, (UserType, FuncSpec))
     def checkMatch(self, x, y):
@@ -835,6 +1126,8 @@ class GenericInstantiator(object):
                         return False
             else:
                 assert isinstance(argx, GenericLiteralArg) and isinstance(argy, GenericLiteralArg), (argx, argy)
+                if argx.literal.value != argy.literal.value:
+                    return False
         # print('checkMatch match', x[0], y[0])
         return True
 
@@ -903,6 +1196,8 @@ class ClassDef(Definition, AstFullContext):
         self.instantiator = None
         self.instantiation = None
         self.loggerVar = None
+        # interpreter.ClassLayout shared by the instances of the class
+        self.layout = None
     def getType(self):
         return self
     def getTypeClass(self):
@@ -911,33 +1206,37 @@ class ClassDef(Definition, AstFullContext):
         return self.constructors[0].getSpec()
     def findMember(self, name):
         # print('ClassDef.findMember', self, name, self.owner)
+        members = classHierarchy.getEntry(self).members
+        if name in members:
+            return members[name]
         node = self.symbols.get(name)
-        if node:
-            return node
         #? findMember shouldnot search in generic instantiation
-        # if self.instantiation:
+        # if not node and self.instantiation:
         #     node = self.instantiation.findLocalSymbol(name)
-        #     if node:
-        #         return node
-        for base in self.bases:
-            node = base.getTarget().findMember(name) if base.getTarget() else None
-            if node:
-                return node
-        return None
+        if not node:
+            node = None
+            for base in self.bases:
+                node = base.getTarget().findMember(name) if base.getTarget() else None
+                if node:
+                    break
+        members[name] = node
+        return node
     def findLocalSymbol(self, name):
         # print('ClassDef.findLocalSymbol', name, self, self.symbols.get(name))
+        localSymbols = classHierarchy.getEntry(self).localSymbols
+        if name in localSymbols:
+            return localSymbols[name]
         node = self.symbols.get(name)
-        if node:
-            return node
-        if self.instantiation:
+        if not node and self.instantiation:
             node = self.instantiation.findLocalSymbol(name)
-            if node:
-                return node
-        for base in self.bases:
-            node = base.getTarget().findLocalSymbol(name) if base.getTarget() else None
-            if node:
-                return node
-        return None
+        if not node:
+            node = None
+            for base in self.bases:
+                node = base.getTarget().findLocalSymbol(name) if base.getTarget() else None
+                if node:
+                    break
+        localSymbols[name] = node
+        return node
     def __repr__(self):
         return 'ClassDef(%s,id=%s,generic=%s,%s)' % (self.name, formatId(self), self.genericParams, self.instantiation)
     def isProtoType(self):
@@ -968,7 +1267,10 @@ class ClassDef(Definition, AstFullContext):
         cls = self.instantiator.find(realGenericArgs)
         if cls:
             # print('GenericClass.instantiate existing', self.name, self, genericArgs, realTypeArgs, cls.genericArgs)
+            cloneCounts['ClassDef.instantiate existing'] += 1
             return cls
+        cloneCounts['ClassDef.instantiate'] += 1
+        instantiatedClasses[self.name] += 1
         cls = self.clone()
         # cls.genericArgs = genericArgs
         cls.instantiation = GenericInstantiation(self.genericParams, genericArgs)
@@ -1009,6 +1311,7 @@ class Identifier(SimpleExpression):
     '''
     could point to a variable or user-defined getType()
     '''
+    __slots__ = ('name', 'target')
     def __init__(self, name):
         # print('Identifier.init', name, formatId(self))
         SimpleExpression.__init__(self)
@@ -1023,11 +1326,15 @@ class Identifier(SimpleExpression):
         return 'ID(%s,%s)' % (self.name, formatId(self))
 
 class Param(SimpleNode):
+    __slots__ = ('name', 'type', 'slot', 'slotRoot')
     def __init__(self, name, type):
         # assert isinstance(argtype, Type), (name, argtype)
         SimpleNode.__init__(self)
         self.name = name
         self.type = type
+        # frame slot of the parameter, assigned by LocalSlotAllocator
+        self.slot = None
+        self.slotRoot = None
         assert not isinstance(type, str), (self, type)
     def getType(self):
         return self.type
@@ -1042,6 +1349,9 @@ class VarTag(SimpleNode):
         SimpleNode.__init__(self)
         self.name = name
         self.type = type
+        # a tag names the matched variable, LocalSlotAllocator gives it the slot of that variable
+        self.slot = None
+        self.slotRoot = None
         assert not isinstance(type, str), (self, type)
     def getType(self):
         return self.type
@@ -1113,6 +1423,9 @@ class FuncDef(BlockDefinition):
         self.resolved = False
         self.injection_cls = None
         self.cls = None
+        # set by LocalSlotAllocator, frames of the function hold frameSize local slots
+        self.slotRoot = None
+        self.frameSize = 0
     def isFunc(self):
         return True
     def getSpec(self):
@@ -1160,6 +1473,7 @@ class ConstDef(SimpleDefinition):
         return ('ConstDef:%d %s' % (len(self.vars), self.vars))
 
 class SingleVarDef(SimpleDefinition):
+    __slots__ = ('name', 'type', 'expectedType', 'initial', 'cls', 'internal', 'slot', 'slotRoot')
     def __init__(self, name, type, initial):
         # print('SingleVarDef.init', name, type, initial, '0x%08x' % id(self))
         assert type is None or isinstance(type, Type), (name, type, initial)
@@ -1170,6 +1484,9 @@ class SingleVarDef(SimpleDefinition):
         self.initial = initial
         self.cls = None
         self.internal = False
+        # frame slot of a local variable, assigned by LocalSlotAllocator
+        self.slot = None
+        self.slotRoot = None
         if self.getType() is None and self.initial:
             self.type = self.initial.getType()
         assert self.type is None or isinstance(self.type, Type), (name, type, self.type, initial)
@@ -1240,6 +1557,7 @@ def unescapeString(s):
     return s.decode('string_escape')
 
 class PrimitiveLiteral(Literal):
+    __slots__ = ('text', 'value')
     def __init__(self, text, type, value=None):
         assert isinstance(type, UserType), ('PrimitiveLiteral', text, type, value)
         assert isinstance(text, str), ('PrimitiveLiteral', text, type, value)
@@ -1389,7 +1707,18 @@ class ListComprehension(BlockExpression):
 def makePrimitiveType(name):
     return UserType([name])
 
+def getTypeKey(t):
+    # None for types which can not be shared yet
+    if not isinstance(t, UserType):
+        return None
+    if isinstance(t.target, UserType):
+        return getTypeKey(t.target)
+    if t.target is None:
+        return None
+    return (t.fullpath, t.target)
+
 class UserType(Type):
+    __slots__ = ('path', 'fullpath', 'genericArgs', 'target', 'interned')
     def __init__(self, path, genericArgs=None):
         assert(path)
         Type.__init__(self)
@@ -1399,10 +1728,17 @@ class UserType(Type):
         for t in self.genericArgs:
             assert isinstance(t, GenericArg), ('UserType.init check generic arg', path, t, self.genericArgs)
         self.target = None
+        self.interned = False
     def getType(self):
         return self.target.getType() if isinstance(self.target, UserType) else self
     def setTarget(self, t):
+        assert not self.interned, ('UserType.setTarget interned', self, t)
         self.target = t
+    def setOwner(self, owner):
+        # an interned type is shared by all the nodes having it, it keeps the owner it was set up with
+        if self.interned:
+            return
+        Type.setOwner(self, owner)
     def getTarget(self):
         return self.target
     def getRealType(self):
@@ -1426,6 +1762,8 @@ class UserType(Type):
     def clone(self):
         if isinstance(self.target, UserType):
             return self.target.clone()
+        if self.interned:
+            return self
         x = UserType(path=self.path, genericArgs=[t.clone() for t in self.genericArgs])
         x.target = self.target
         return x
@@ -1455,6 +1793,7 @@ class GenericExpr(SimpleExpression):
         return self.target.getType() if self.target else None
 
 class Call(SimpleExpression):
+    __slots__ = ('caller', 'args', 'namedArgs', 'type', 'spec')
     def __init__(self, caller, args, namedArgs = None):
         # print('Call', caller, args)
         SimpleExpression.__init__(self)
@@ -1544,10 +1883,13 @@ class CompoundStatement(BlockStatement):
         assert len(self.symbols) == 0
 
 class StatementBody(SimpleNode):
+    __slots__ = ('statements', 'declaresVars')
     def __init__(self, statements):
         assert statements is not None
         SimpleNode.__init__(self)
         self.statements = statements
+        # cleared by LocalSlotAllocator when no variable is declared directly in the body
+        self.declaresVars = True
         for stmt in statements:
             assert stmt, statements
     def __repr__(self):
@@ -1781,6 +2123,7 @@ class IfElseExpr(SimpleExpression):
         return 'IfElseExpr(%s,%s,%s)' % (self.condition, self.truePart, self.falsePart)
 
 class BinaryOp(SimpleExpression):
+    __slots__ = ('op', 'left', 'right')
     def __init__(self, op, left, right):
         # print('BinaryOp.init', left, right, op)
         assert isinstance(op, str), (op, left, right)
@@ -1842,11 +2185,14 @@ class CallStatement(SimpleStatement):
         self.call.dump(out, depth)
 
 class AttrRef(SimpleExpression):
+    __slots__ = ('object', 'ref', 'target', 'inlineCache')
     def __init__(self, object, ref):
         SimpleExpression.__init__(self)
         self.object = object
         self.ref = ref
         self.target = None
+        # receiver class => member, filled by the interpreter
+        self.inlineCache = None
     def getSpec(self):
         # print('AttrRef.getSpec', self.object, self.ref, self.getTarget())
         return self.getTarget().getSpec() if self.getTarget() else None
@@ -1885,6 +2231,9 @@ class Closure(BlockExpression):
         self.spec = spec
         # self.setTarget(self)
         self.stack = None
+        # closures share the frame layout of the enclosing function
+        self.slotRoot = None
+        self.frameSize = 0
         # self.names = {}
     def getType(self):
         return self.spec
@@ -1944,7 +2293,7 @@ class Script(SimpleNode):
         if name == 'args':
             if hasattr(self, name):
                 raise TypeError
-        self.__dict__[name] = val
+        object.__setattr__(self, name, val)
     def setTarget(self, t):
         self.target = t
     def getTarget(self):
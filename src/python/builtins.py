@@ -160,9 +160,6 @@ class ClassInfo(BuiltinTypeClass):
 
 
 class GenericDictEachFunc(LibFunc):
-    def __init__(self, cls):
-        argtype = makeFuncSpec(ast.makePrimitiveType('void'), [cls.createKeyType(), cls.createValueType()])
-        super(GenericDictEachFunc, self).__init__(cls, makeFuncProto('each', ast.makePrimitiveType('void'), [argtype]))
     def evaluateCall(self, visitor, callinfo):
         # visitor.logger.debug('DictEachFunc.evaluateCall entry start', self, callinfo)
         assert len(callinfo.args) == 1, (callinfo.caller.object, callinfo.args)
@@ -188,54 +185,134 @@ class GenericClass(BuiltinTypeClass):
         self.impl = impl
         self.genericParams = impl.genericParams
         self.instantiator = ast.GenericInstantiator(impl.genericParams)
-        self.astFieldNames = ['genericParams']
+        # the methods of all the instantiations, built and resolved once here. their types name the generic params,
+        # and the generic class itself for the instantiation, see GenericClassImpl.bindMethod
+        self.methods = {}
+        for d in impl.createMethods(self):
+            self.addDef(d)
+            self.methods[d.name] = d
+        self.astFieldNames = ['genericParams', 'definitions']
+    def findLocalSymbol(self, name):
+        # the generic params only stand for the types bound by an instantiation
+        for param in self.genericParams:
+            if isinstance(param, (ast.GenericTypeParam, ast.GenericVariadicTypeParam)) and param.name == name:
+                return param
+        return BuiltinTypeClass.findLocalSymbol(self, name)
     def instantiate(self, genericArgs, visitor):
         realGenericArgs = self.instantiator.getRealArgs(genericArgs)
         cls = self.instantiator.find(realGenericArgs)
         if cls:
             # visitor.logger.debug('GenericClass.instantiate existing', self.name, self, genericArgs, realTypeArgs, cls.genericArgs)
             return cls
-        cls = self.impl(realGenericArgs)
+        cls = self.impl(realGenericArgs, self)
         # visitor.logger.debug('GenericClass.instantiate new', self.name, self, realGenericArgs, cls.genericArgs)
         self.instantiator.cache(cls)
         visitor.setupNewItem(cls, self, True)
         return cls
 
 class GenericClassImpl(BuiltinTypeClass):
-    def __init__(self, genericParams, genericArgs):
+    def __init__(self, genericParams, genericArgs, genericClass):
         BuiltinTypeClass.__init__(self)
         self.instantiation = ast.GenericInstantiation(genericParams, genericArgs)
+        self.genericClass = genericClass
+        # methods bound on first use, and the types standing for the generic params and for this instantiation in them
+        self.boundMethods = {}
+        self.paramTypes = {}
+        self.selfType = None
         # self.astFieldNames = ['funcs']
+    @staticmethod
+    def createMethods(cls):
+        return []
     def cacheName(self, visitor):
         self.doVisitChildren(visitor)
     def findLocalSymbol(self, name):
         # print('GenericClassImpl.findLocalSymbol', name, self)
         ret = self.instantiation.findLocalSymbol(name)
         # print('GenericClassImpl.findLocalSymbol result', name, self, gt)
-        return ret if ret else BuiltinTypeClass.findLocalSymbol(self, name)
+        if not ret:
+            ret = BuiltinTypeClass.findLocalSymbol(self, name)
+        return ret if ret else self.getMethod(name)
+    def getMethod(self, name):
+        method = self.boundMethods.get(name)
+        if method is None:
+            template = self.genericClass.methods.get(name)
+            if template is None:
+                return None
+            method = self.bindMethod(template)
+            self.boundMethods[name] = method
+        return method
+    def bindMethod(self, template):
+        # only the types naming the generic params differ between the instantiations, all the others are shared
+        spec = self.bindType(template.spec)
+        if spec is template.spec:
+            return template
+        method = type(template)(self, ast.FuncProto(template.name, spec))
+        method.evaluator = template.evaluator
+        spec.setOwner(method.proto)
+        method.setOwner(self)
+        return method
+    def bindType(self, t):
+        if isinstance(t, ast.UserType):
+            if len(t.path) == 1 and t.fullpath in self.instantiation.namedGenericArgs:
+                return self.getParamType(t.fullpath)
+            if t.fullpath == self.genericClass.name and not t.genericArgs:
+                return self.getSelfType()
+            return t
+        if isinstance(t, ast.FuncSpec):
+            types = [self.bindType(param.type) for param in t.params]
+            returnType = self.bindType(t.returnType) if t.returnType else None
+            if returnType is t.returnType and all([x is param.type for x, param in zip(types, t.params)]):
+                return t
+            spec = ast.FuncSpec([ast.Param(param.name, x) for x, param in zip(types, t.params)], returnType)
+            for param in spec.params:
+                param.setOwner(spec)
+                if param.type.owner is None:
+                    param.type.setOwner(param)
+            if returnType is not None and returnType.owner is None:
+                returnType.setOwner(spec)
+            return spec
+        return t
+    def getParamType(self, name):
+        # resolved as the generic param is inside the instantiation
+        t = self.paramTypes.get(name)
+        if t is None:
+            t = ast.UserType([name])
+            t.setTarget(self.instantiation.findLocalSymbol(name))
+            t.setOwner(self)
+            self.paramTypes[name] = t
+        return t
+    def getSelfType(self):
+        if self.selfType is None:
+            args = [ast.GenericTypeArg(self.getParamType(param.name)) for param in self.instantiation.genericParams]
+            self.selfType = ast.UserType([self.genericClass.name], args)
+            for arg in args:
+                arg.setOwner(self.selfType)
+            self.selfType.setTarget(self)
+            self.selfType.setOwner(self)
+        return self.selfType
 
 class GenericDictClassImpl(GenericClassImpl):
     genericParams = [ast.GenericTypeParam('KeyType'), ast.GenericTypeParam('ValueType')]
-    def __init__(self, genericArgs):
-        super(GenericDictClassImpl, self).__init__(GenericDictClassImpl.genericParams, genericArgs)
-        self.addDef(SimpleTypeFunc(self, 'size() => int', evaluator=len))
-        self.addDef(SimpleTypeFunc(self, 'clear()', evaluator=lambda d:d.clear()))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('get', self.createValueType(), [self.createKeyType(), self.createValueType()])))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('set', ast.makePrimitiveType('void'), [self.createKeyType(), self.createValueType()])))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('add', ast.makePrimitiveType('void'), [self.createKeyType(), self.createValueType()])))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('remove', ast.makePrimitiveType('void'), [self.createKeyType()])))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('contains', ast.makePrimitiveType('bool'), [self.createKeyType()])))
-        self.addDef(GenericDictEachFunc(self))
+    def __init__(self, genericArgs, genericClass):
+        super(GenericDictClassImpl, self).__init__(GenericDictClassImpl.genericParams, genericArgs, genericClass)
+    @staticmethod
+    def createMethods(cls):
+        keyType = lambda: ast.UserType(['KeyType'])
+        valueType = lambda: ast.UserType(['ValueType'])
+        return [SimpleTypeFunc(cls, 'size() => int', evaluator=len),
+            SimpleTypeFunc(cls, 'clear()', evaluator=lambda d:d.clear()),
+            CustomTypeFunc(cls, makeFuncProto('get', valueType(), [keyType(), valueType()])),
+            CustomTypeFunc(cls, makeFuncProto('set', ast.makePrimitiveType('void'), [keyType(), valueType()])),
+            CustomTypeFunc(cls, makeFuncProto('add', ast.makePrimitiveType('void'), [keyType(), valueType()])),
+            CustomTypeFunc(cls, makeFuncProto('remove', ast.makePrimitiveType('void'), [keyType()])),
+            CustomTypeFunc(cls, makeFuncProto('contains', ast.makePrimitiveType('bool'), [keyType()])),
+            GenericDictEachFunc(cls, makeFuncProto('each', ast.makePrimitiveType('void'), [makeFuncSpec(ast.makePrimitiveType('void'), [keyType(), valueType()])]))]
     def getItemType(self):
         return self.instantiation.genericArgs[1].type.getRealType()
     def getKeyType(self):
         return self.instantiation.genericArgs[0].type.getRealType()
     def getValueType(self):
         return self.instantiation.genericArgs[1].type.getRealType()
-    def createKeyType(self):
-        return ast.UserType(['KeyType'])
-    def createValueType(self):
-        return ast.UserType(['ValueType'])
     def eval_get(self, coll, key, defval=None):
         # print('DictClass.eval_get', coll, key, defval)
         return coll.get(key, defval)
@@ -256,9 +333,6 @@ class GenericDictClassImpl(GenericClassImpl):
 
 
 class GenericSetEachFunc(LibFunc):
-    def __init__(self, cls):
-        argtype = makeFuncSpec(ast.makePrimitiveType('void'), [cls.createElementType(), ast.makePrimitiveType('int')])
-        super(GenericSetEachFunc, self).__init__(cls, makeFuncProto('each', ast.makePrimitiveType('void'), [argtype]))
     def evaluateCall(self, visitor, callinfo):
         # visitor.logger.debug('SetEachFunc.evaluateCall entry start', self, callinfo)
         assert len(callinfo.args) == 1, (callinfo.caller.object, callinfo.args)
@@ -281,24 +355,23 @@ class GenericSetEachFunc(LibFunc):
 
 class GenericSetClassImpl(GenericClassImpl):
     genericParams = [ast.GenericTypeParam('ElementType')]
-    def __init__(self, genericArgs):
-        super(GenericSetClassImpl, self).__init__(GenericSetClassImpl.genericParams, genericArgs)
-        self.addDef(SimpleTypeFunc(self, 'size() => int'))
-        self.addDef(SimpleTypeFunc(self, 'clear()'))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('add', ast.makePrimitiveType('void'), [self.createElementType()])))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('remove', ast.makePrimitiveType('void'), [self.createElementType()])))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('contains', ast.makePrimitiveType('bool'), [self.createElementType()])))
-        self.addDef(GenericSetEachFunc(self))
-    def createElementType(self):
-        return ast.UserType(['ElementType'])
+    def __init__(self, genericArgs, genericClass):
+        super(GenericSetClassImpl, self).__init__(GenericSetClassImpl.genericParams, genericArgs, genericClass)
+    @staticmethod
+    def createMethods(cls):
+        elementType = lambda: ast.UserType(['ElementType'])
+        return [SimpleTypeFunc(cls, 'size() => int', evaluator=len),
+            SimpleTypeFunc(cls, 'clear()', evaluator=lambda s:s.clear()),
+            CustomTypeFunc(cls, makeFuncProto('add', ast.makePrimitiveType('void'), [elementType()])),
+            CustomTypeFunc(cls, makeFuncProto('remove', ast.makePrimitiveType('void'), [elementType()])),
+            CustomTypeFunc(cls, makeFuncProto('contains', ast.makePrimitiveType('bool'), [elementType()])),
+            GenericSetEachFunc(cls, makeFuncProto('each', ast.makePrimitiveType('void'), [makeFuncSpec(ast.makePrimitiveType('void'), [elementType(), ast.makePrimitiveType('int')])]))]
     def evaluateNil(self, visitor):
         return set()
     def eval_add(self, coll, key):
         coll.add(key)
     def eval_remove(self, coll, key):
         coll.remove(key)
-    def eval_size(self, coll):
-        return len(coll)
     def eval_contains(self, coll, key):
         return key in coll
     def eval_not_contains(self, coll, key):
@@ -308,11 +381,10 @@ class GenericSetClassImpl(GenericClassImpl):
 def del_list(a):
     del a[:]
 
+def del_item(a, index):
+    del a[index]
+
 class GenericListEachFunc(LibFunc):
-    def __init__(self, cls):
-        argtype = makeFuncSpec(ast.makePrimitiveType('void'), [cls.createElementType(), ast.makePrimitiveType('int')])
-        super(GenericListEachFunc, self).__init__(cls, makeFuncProto('each', ast.makePrimitiveType('void'), [argtype]))
-        # print('GenericListEachFunc.init', self.getSpec(), self)
     def evaluateCall(self, visitor, callinfo):
         # visitor.logger.debug('ListEachFunc.evaluateCall entry start', self, callinfo, callinfo.caller.object, callinfo.getOwnerFunc())
         coll = callinfo.caller.object.visit(visitor)
@@ -337,30 +409,32 @@ class GenericListEachFunc(LibFunc):
 
 class GenericListClassImpl(GenericClassImpl):
     genericParams = [ast.GenericTypeParam('ElementType')]
-    def __init__(self, genericArgs):
-        super(GenericListClassImpl, self).__init__(GenericListClassImpl.genericParams, genericArgs)
-        self.addDef(SimpleTypeFunc(self, 'size() => int', evaluator=len))
-        self.addDef(SimpleTypeFunc(self, 'empty() => bool', evaluator=lambda left:len(left)==0))
-        self.addDef(SimpleTypeFunc(self, 'clear()', evaluator=del_list))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('set', ast.makePrimitiveType('void'), [ast.makePrimitiveType('int'), self.createElementType()])))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('flatten', self.createElementType(), [self.createCollectionType()])))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('swap', ast.makePrimitiveType('void'), [self.createCollectionType()])))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('append', ast.makePrimitiveType('void'), [self.createElementType()])))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('extend', ast.makePrimitiveType('void'), [self.createCollectionType()])))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('insert', ast.makePrimitiveType('void'), [ast.makePrimitiveType('int'), self.createElementType()])))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('remove', ast.makePrimitiveType('void'), [self.createElementType()])))
-        self.addDef(CustomTypeFunc(self, 'removeAt(int)'))
-        self.addDef(CustomTypeFunc(self, makeFuncProto('contains', ast.makePrimitiveType('bool'), [self.createElementType()])))
-        self.addDef(GenericListEachFunc(self))
+    def __init__(self, genericArgs, genericClass):
+        super(GenericListClassImpl, self).__init__(GenericListClassImpl.genericParams, genericArgs, genericClass)
         self.ops = {'==' : operator.eq, '!=':operator.ne,
         '+':operator.add,'*':operator.mul}
+    @staticmethod
+    def createMethods(cls):
+        # the ones not bound to an instantiation can not use its eval_ methods, so they get explicit evaluators
+        elementType = lambda: ast.UserType(['ElementType'])
+        # the generic class stands for the instantiation, i.e. [ElementType]
+        collectionType = lambda: ast.UserType([cls.name])
+        return [SimpleTypeFunc(cls, 'size() => int', evaluator=len),
+            SimpleTypeFunc(cls, 'empty() => bool', evaluator=lambda left:len(left)==0),
+            SimpleTypeFunc(cls, 'clear()', evaluator=del_list),
+            CustomTypeFunc(cls, 'removeAt(int)', evaluator=del_item),
+            CustomTypeFunc(cls, makeFuncProto('set', ast.makePrimitiveType('void'), [ast.makePrimitiveType('int'), elementType()])),
+            CustomTypeFunc(cls, makeFuncProto('flatten', elementType(), [collectionType()])),
+            CustomTypeFunc(cls, makeFuncProto('swap', ast.makePrimitiveType('void'), [collectionType()])),
+            CustomTypeFunc(cls, makeFuncProto('append', ast.makePrimitiveType('void'), [elementType()])),
+            CustomTypeFunc(cls, makeFuncProto('extend', ast.makePrimitiveType('void'), [collectionType()])),
+            CustomTypeFunc(cls, makeFuncProto('insert', ast.makePrimitiveType('void'), [ast.makePrimitiveType('int'), elementType()])),
+            CustomTypeFunc(cls, makeFuncProto('remove', ast.makePrimitiveType('void'), [elementType()])),
+            CustomTypeFunc(cls, makeFuncProto('contains', ast.makePrimitiveType('bool'), [elementType()])),
+            GenericListEachFunc(cls, makeFuncProto('each', ast.makePrimitiveType('void'), [makeFuncSpec(ast.makePrimitiveType('void'), [elementType(), ast.makePrimitiveType('int')])]))]
     def getItemType(self):
         # print('GenericListClassImpl.getItemType', self.name, self.genericArgs)
         return self.instantiation.genericArgs[0].type.getRealType()
-    def createElementType(self):
-        return ast.UserType(['ElementType'])
-    def createCollectionType(self):
-        return ast.createListType(self.createElementType())
     def eval_append(self, coll, item):
         # assert False, (self, coll, item)
         coll.append(item)
@@ -385,8 +459,6 @@ class GenericListClassImpl(GenericClassImpl):
         for item in coll:
             ret.extend(item)
         return ret
-    def eval_removeAt(self, coll, val):
-        del coll[val]
     def eval_remove(self, coll, val):
         coll.remove(val)
     def eval_insert(self, coll, pos, val):
@@ -395,9 +467,6 @@ class GenericListClassImpl(GenericClassImpl):
         coll[pos] = val
 
 class GenericArrayEachFunc(LibFunc):
-    def __init__(self, cls):
-        argtype = makeFuncSpec(ast.makePrimitiveType('void'), [cls.createElementType(), ast.makePrimitiveType('int')])
-        super(GenericArrayEachFunc, self).__init__(cls, makeFuncProto('each', ast.makePrimitiveType('void'), [argtype]))
     def evaluateCall(self, visitor, callinfo):
         # visitor.logger.debug('GenericArrayEachFunc.evaluateCall entry start', self, callinfo, callinfo.caller.object, callinfo.getOwnerFunc())
         coll = callinfo.caller.object.visit(visitor)
@@ -422,13 +491,14 @@ class GenericArrayEachFunc(LibFunc):
 
 class GenericArrayClassImpl(GenericClassImpl):
     genericParams = [ast.GenericTypeParam('ElementType'), ast.GenericLiteralParam(ast.UserType(['int']))]
-    def __init__(self, genericArgs):
-        super(GenericArrayClassImpl, self).__init__(GenericArrayClassImpl.genericParams, genericArgs)
-        self.addDef(GenericArrayEachFunc(self))
+    def __init__(self, genericArgs, genericClass):
+        super(GenericArrayClassImpl, self).__init__(GenericArrayClassImpl.genericParams, genericArgs, genericClass)
         assert isinstance(genericArgs[1].literal, ast.IntLiteral), (genericArgs[1], self)
         self.size = genericArgs[1].literal.value
-    def createElementType(self):
-        return ast.UserType(['ElementType'])
+    @staticmethod
+    def createMethods(cls):
+        elementType = ast.UserType(['ElementType'])
+        return [GenericArrayEachFunc(cls, makeFuncProto('each', ast.makePrimitiveType('void'), [makeFuncSpec(ast.makePrimitiveType('void'), [elementType, ast.makePrimitiveType('int')])]))]
     def evaluateNil(self, visitor):
         # assert False
         return [visitor.nilValue] * self.size
@@ -533,9 +603,9 @@ class AnyRefClass(BuiltinTypeClass):
 
 class GenericTupleClassImpl(GenericClassImpl):
     genericParams = [ast.GenericVariadicTypeParam('ElementTypes')]
-    def __init__(self, genericArgs):
+    def __init__(self, genericArgs, genericClass):
         assert len(genericArgs) == 1, genericArgs
-        super(GenericTupleClassImpl, self).__init__(GenericTupleClassImpl.genericParams, genericArgs)
+        super(GenericTupleClassImpl, self).__init__(GenericTupleClassImpl.genericParams, genericArgs, genericClass)
         # print('GenericTupleClassImpl.init', genericArgs, genericArgs[0].types)
     def evaluateNil(self, visitor):
         return visitor.nilValue
@@ -0,0 +1,78 @@
+import gc
+import sys
+import collections
+import ast
+import libs
+import interpreter
+
+runtimeClasses = (interpreter.VarHolder, interpreter.FuncDefEvaluator, interpreter.EvaluatorScope, interpreter.EvaluatorStack)
+containerTypes = (list, tuple, dict, set)
+slotNamesCache = {}
+
+def getSlotNames(cls):
+    names = slotNamesCache.get(cls)
+    if names is None:
+        names = []
+        for c in cls.__mro__:
+            slots = c.__dict__.get('__slots__', ())
+            names.extend([slots] if isinstance(slots, str) else [name for name in slots if name != '__dict__'])
+        slotNamesCache[cls] = names
+    return names
+
+def getApproxSize(obj):
+    # the object, its __dict__ and the containers it holds directly, nodes and strings are shared and counted on their own
+    size = sys.getsizeof(obj)
+    d = getattr(obj, '__dict__', None)
+    values = []
+    if d is not None:
+        size += sys.getsizeof(d)
+        values.extend(d.itervalues())
+    for name in getSlotNames(type(obj)):
+        values.append(getattr(obj, name, None))
+    for value in values:
+        if type(value) in containerTypes:
+            size += sys.getsizeof(value)
+    return size
+
+class ObjectCensus(object):
+    '''
+    live object counts and approximate retained bytes grouped as ast nodes, interpreter runtime objects
+    and gml objects (ClassDefEvaluator per gml class), taken by PhaseMetrics after each phase with --census.
+    '''
+    def __init__(self, limit=30):
+        self.limit = limit
+    def take(self):
+        gc.collect()
+        groups = {'ast' : {}, 'runtime' : {}, 'gml' : {}}
+        for obj in gc.get_objects():
+            if isinstance(obj, interpreter.ClassDefEvaluator):
+                self.add(groups['runtime'], 'ClassDefEvaluator', obj)
+                self.add(groups['gml'], obj.cls.name, obj)
+            elif isinstance(obj, runtimeClasses):
+                self.add(groups['runtime'], type(obj).__name__, obj)
+            elif isinstance(obj, ast.AstNode):
+                self.add(groups['ast'], type(obj).__name__, obj)
+        groups['clones'] = dict(ast.cloneCounts)
+        groups['instantiated'] = dict(ast.instantiatedClasses)
+        groups['constructed'] = dict(libs.constructedCounts)
+        return groups
+    def add(self, group, name, obj):
+        entry = group.get(name)
+        if entry is None:
+            entry = [0, 0]
+            group[name] = entry
+        entry[0] += 1
+        entry[1] += getApproxSize(obj)
+    def dump(self, name, census):
+        print('census %s' % name)
+        for groupname in ['ast', 'runtime', 'gml']:
+            group = census[groupname]
+            print('  %s count=%d size=%d' % (groupname, sum([e[0] for e in group.itervalues()]), sum([e[1] for e in group.itervalues()])))
+            for clsname, (count, size) in sorted(group.iteritems(), key=lambda item: -item[1][1])[:self.limit]:
+                print('    %-30s count=%-8d size=%d' % (clsname, count, size))
+        print('  clones %s' % ' '.join(['%s=%d' % item for item in sorted(census['clones'].iteritems())]))
+        instantiated = collections.Counter(census['instantiated'])
+        if instantiated:
+            print('  instantiated %s' % ' '.join(['%s=%d' % item for item in instantiated.most_common(self.limit)]))
+        constructed = collections.Counter(census['constructed'])
+        print('  constructed by GmlAstConstructor total=%d %s' % (sum(constructed.itervalues()), ' '.join(['%s=%d' % item for item in constructed.most_common(self.limit)])))
@@ -0,0 +1,699 @@
+import ast
+import basetype
+import builtins
+import libs
+import xutils
+from interpreter import Interpreter, FlowFlags, VarHolder, FuncDefEvaluator, ClassDefEvaluator
+
+# evaluateBinaryOp implementations which just evaluate both sides and apply self.ops[op]
+simpleBinaryOps = set([
+    builtins.IntegerClass.evaluateBinaryOp.im_func,
+    builtins.FloatingClass.evaluateBinaryOp.im_func,
+    builtins.CharClass.evaluateBinaryOp.im_func,
+    builtins.GenericListClassImpl.evaluateBinaryOp.im_func,
+    ])
+
+def getTypeClassOf(node):
+    # resolution may fail for code which is never executed, the node is visited then
+    try:
+        return node.getTypeClass()
+    except (AttributeError, AssertionError), e:
+        return None
+
+def isDefaultMethod(obj, name, cls):
+    func = getattr(type(obj), name, None)
+    return func is not None and getattr(func, 'im_func', None) is getattr(cls, name).im_func
+
+class ClosureCompiler(object):
+    '''
+    compiles function bodies into trees of python closures for the interpreter.
+    identifier kinds, type classes, operators and call targets are resolved once,
+    node kinds without a compiled form are evaluated by visiting them.
+    '''
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.interpreterClass = interpreter.__class__
+        self.bodies = {}
+        self.compiledCount = 0
+        self.visitedCount = 0
+        self.logger = xutils.createLogger('ClosureCompiler')
+    def getBody(self, body):
+        func = self.bodies.get(body)
+        if func is None:
+            func = self.compile(body)
+            self.bodies[body] = func
+        return func
+    def compile(self, node):
+        handlers = ast.visitDispatchTable.get((self.interpreterClass, self.interpreter.opname, node.__class__))
+        if handlers is None:
+            handlers = ast.makeVisitHandlers(self.interpreterClass, self.interpreter.opname, node.__class__)
+        if handlers:
+            func, internal = handlers[0]
+            name = func.__name__
+            if not internal and name.startswith('evaluate_') and getattr(self.interpreterClass, name).im_func is func:
+                compilefunc = getattr(self, 'compile_' + name[len('evaluate_'):], None)
+                if compilefunc:
+                    self.compiledCount += 1
+                    return compilefunc(node)
+        return self.compileVisit(node)
+    def compileVisit(self, node):
+        self.visitedCount += 1
+        interpreter = self.interpreter
+        visit = node.visit
+        return lambda: visit(interpreter)
+    def isVarIdentifier(self, node):
+        if not isinstance(node, ast.Identifier):
+            return False
+        target = node.getTarget()
+        return not isinstance(target, (ast.ClassDef, ast.LibClassBase, ast.EnumDef, basetype.LibLiteral, ast.FuncDef, ast.FuncProto, basetype.LibFunc))
+    def isPureExpr(self, node):
+        # evaluating the node has no side effects, so a repeated evaluation can be skipped
+        if isinstance(node, ast.This) or self.isVarIdentifier(node):
+            return True
+        if isinstance(node, ast.AttrRef):
+            return self.isPureExpr(node.object)
+        return False
+    def compileArgs(self, args):
+        interpreter = self.interpreter
+        argfuncs = []
+        for arg in args:
+            if isDefaultMethod(arg, 'evaluateParam', ast.AstNode) and not isinstance(arg, (ast.StatementBody, ast.StatementBlock)):
+                argfuncs.append(self.compile(arg))
+            else:
+                argfuncs.append(lambda arg=arg: arg.evaluateParam(interpreter))
+        return argfuncs
+    def compileNamedArgs(self, namedArgs):
+        return [(arg.name, self.compileArgs([arg.value])[0]) for arg in namedArgs]
+
+    def compile_StatementBody(self, stmtbody):
+        stmts = [self.compile(stmt) for stmt in stmtbody.statements]
+        stacks = self.interpreter.stacks
+        NORMAL = FlowFlags.NORMAL
+        def evalStatementBody():
+            stack = stacks[-1]
+            for stmt in stmts:
+                stmt()
+                if stack.flowFlag != NORMAL:
+                    break
+        return evalStatementBody
+    def compile_StatementBlock(self, stmtblock):
+        body = self.compile(stmtblock.body)
+        if not stmtblock.body.declaresVars:
+            return body
+        pushScope = self.interpreter.pushScope
+        popScope = self.interpreter.popScope
+        def evalStatementBlock():
+            pushScope()
+            body()
+            popScope()
+        return evalStatementBlock
+    def compile_IfStatement(self, stmt):
+        branches = [(self.compile(branch.condition), self.compile(branch.body), branch.body.declaresVars, branch) for branch in stmt.branches]
+        elseBranch = self.compile(stmt.elseBranch) if stmt.elseBranch else None
+        pushScope = self.interpreter.pushScope
+        popScope = self.interpreter.popScope
+        nilValue = self.interpreter.nilValue
+        def evalIfStatement():
+            for condition, body, declaresVars, branch in branches:
+                if declaresVars:
+                    pushScope()
+                cond = condition()
+                assert cond is not None, ('evaluate_IfStatement', stmt, branch.condition, cond)
+                if cond and cond != nilValue:
+                    body()
+                    if declaresVars:
+                        popScope()
+                    return
+                if declaresVars:
+                    popScope()
+            if elseBranch:
+                elseBranch()
+        return evalIfStatement
+    def compile_ForStatement(self, stmt):
+        init = self.compile(stmt.init) if stmt.init else None
+        condition = self.compile(stmt.condition) if stmt.condition is not None else None
+        step = self.compile(stmt.step) if stmt.step else None
+        body = self.compile(stmt.body)
+        declaresVars = stmt.body.declaresVars
+        stacks = self.interpreter.stacks
+        pushScope = self.interpreter.pushScope
+        popScope = self.interpreter.popScope
+        NORMAL = FlowFlags.NORMAL
+        RETURN = FlowFlags.RETURN
+        BREAK = FlowFlags.BREAK
+        CONTINUE = FlowFlags.CONTINUE
+        def evalForStatement():
+            if init:
+                pushScope()
+                init()
+            while condition is None or condition():
+                if declaresVars:
+                    pushScope()
+                body()
+                stack = stacks[-1]
+                flowFlag = stack.flowFlag
+                if flowFlag == RETURN:
+                    if declaresVars:
+                        popScope()
+                    break
+                if flowFlag == BREAK:
+                    stack.flowFlag = NORMAL
+                    if declaresVars:
+                        popScope()
+                    break
+                if flowFlag == CONTINUE:
+                    stack.flowFlag = NORMAL
+                if step:
+                    step()
+                if declaresVars:
+                    popScope()
+            if init:
+                popScope()
+        return evalForStatement
+    def compile_ForEachStatement(self, stmt):
+        item = self.compile(stmt.item)
+        collection = self.compile(stmt.collection)
+        body = self.compile(stmt.body)
+        declaresVars = stmt.body.declaresVars
+        pushScope = self.interpreter.pushScope
+        popScope = self.interpreter.popScope
+        def evalForEachStatement():
+            pushScope()
+            itemvar = item()
+            coll = collection()
+            for x in coll:
+                if declaresVars:
+                    pushScope()
+                itemvar.setValue(x)
+                body()
+                if declaresVars:
+                    popScope()
+            popScope()
+        return evalForEachStatement
+    def compile_ForEachDictStatement(self, stmt):
+        key = self.compile(stmt.key)
+        value = self.compile(stmt.value)
+        collection = self.compile(stmt.collection)
+        body = self.compile(stmt.body)
+        pushScope = self.interpreter.pushScope
+        popScope = self.interpreter.popScope
+        def evalForEachDictStatement():
+            pushScope()
+            keyvar = key()
+            valvar = value()
+            coll = collection()
+            for k, v in coll.iteritems():
+                keyvar.setValue(k)
+                valvar.setValue(v)
+                body()
+            popScope()
+        return evalForEachDictStatement
+    def compile_SingleVarDef(self, var):
+        interpreter = self.interpreter
+        stacks = interpreter.stacks
+        name = var.name
+        if var.initial and var.cls is None:
+            initial = self.compile(var.initial)
+            def createVar():
+                val = initial()
+                assert val is not None, ('createVar initial', var, var.initial, interpreter.getThis(), var.getOwnerFunc(), var.getOwnerClass(), val)
+                return val
+        else:
+            typeClass = getTypeClassOf(var.getType())
+            evaluateNil = getattr(typeClass, 'evaluateNil', None)
+            if evaluateNil is None:
+                return self.compileVisit(var)
+            def createVar():
+                val = evaluateNil(interpreter)
+                assert val is not None, ('createVar', var, var.initial, interpreter.getThis(), var.getOwnerFunc(), var.getOwnerClass(), val)
+                return val
+        def evalSingleVarDef():
+            val = createVar()
+            if name == 'text':
+                assert isinstance(val, str), (var, val, var.getOwnerFunc(), var.getOwnerClass())
+            varholder = VarHolder(var, val)
+            stacks[-1].addLocal(var, varholder)
+            return varholder
+        return evalSingleVarDef
+    def compile_Return(self, stmt):
+        value = self.compile(stmt.value) if stmt.value is not None else None
+        stacks = self.interpreter.stacks
+        nilValue = self.interpreter.nilValue
+        RETURN = FlowFlags.RETURN
+        def evalReturn():
+            ret = value() if value else nilValue
+            if ret is None:
+                ret = nilValue
+            stack = stacks[-1]
+            stack.flowFlag = RETURN
+            stack.returnValue = ret
+        return evalReturn
+    def compile_Break(self, stmt):
+        stacks = self.interpreter.stacks
+        BREAK = FlowFlags.BREAK
+        def evalBreak():
+            stacks[-1].flowFlag = BREAK
+        return evalBreak
+    def compile_Continue(self, stmt):
+        stacks = self.interpreter.stacks
+        CONTINUE = FlowFlags.CONTINUE
+        def evalContinue():
+            stacks[-1].flowFlag = CONTINUE
+        return evalContinue
+    def compile_CallStatement(self, callstmt):
+        return self.compile(callstmt.call)
+    def compile_AssertStatement(self, stmt):
+        expr = self.compile(stmt.expr)
+        msg = self.compile(stmt.msg) if stmt.msg else None
+        def evalAssertStatement():
+            ret = expr()
+            if msg:
+                assert ret, (msg(), stmt.getOwnerFunc(), stmt.getOwnerClass())
+            else:
+                assert ret, (stmt.getOwnerFunc(), stmt.getOwnerClass())
+        return evalAssertStatement
+    def compile_Assignment(self, assign):
+        values = [self.compile(val) for val in assign.values]
+        setters = [self.compileAssignTarget(assign.op, target) for target in assign.targets]
+        count = len(setters)
+        def evalAssignment():
+            vals = [val() for val in values]
+            for i in range(count):
+                setters[i](vals[i])
+        return evalAssignment
+    def compileAssignTarget(self, op, target):
+        interpreter = self.interpreter
+        if isinstance(target, ast.Subscript) and op == '=':
+            collection = self.compile(target.collection)
+            key = self.compile(target.key)
+            typeClass = getTypeClassOf(target.collection)
+            evalSet = getattr(typeClass, 'eval_set', None)
+            if evalSet is None:
+                evalSet = lambda coll, key, val: target.collection.getTypeClass().eval_set(coll, key, val)
+            def setSubscript(val):
+                coll = collection()
+                evalSet(coll, key(), val)
+            return setSubscript
+        opfunc = interpreter.assign_ops.get(op)
+        if opfunc and self.isVarIdentifier(target) and isDefaultMethod(target, 'evaluateVar', ast.AstNode) and \
+                ast.findInvokeHandler(self.interpreterClass, 'evaluateVar', target.__class__) is Interpreter.evaluateVar_Identifier.im_func:
+            getLocal = self.compileGetLocal(target)
+            if op == '=':
+                def setVar(val):
+                    getLocal().setValue(val)
+                return setVar
+            def updateVar(val):
+                varholder = getLocal()
+                varholder.setValue(opfunc(varholder.getValue(), val))
+            return updateVar
+        if opfunc and op == '=' and isinstance(target, ast.AttrRef) and self.isPureExpr(target.object) and \
+                isDefaultMethod(target, 'evaluateVar', ast.AstNode) and \
+                ast.findInvokeHandler(self.interpreterClass, 'evaluateVar', target.__class__) is Interpreter.evaluateVar_AttrRef.im_func:
+            obj = self.compile(target.object)
+            def setAttr(val):
+                obj().evaluateAttrVar(interpreter, target).setValue(val)
+            return setAttr
+        def assignTarget(val):
+            interpreter.evalAssignment(interpreter.assign_ops[op], target, val)
+        return assignTarget
+    def compile_Identifier(self, identifier):
+        target = identifier.getTarget()
+        stacks = self.interpreter.stacks
+        if isinstance(target, (ast.ClassDef, ast.LibClassBase, ast.EnumDef)):
+            return lambda: target
+        if isinstance(target, basetype.LibLiteral):
+            return lambda: target.value
+        if isinstance(target, ast.FuncDef) or isinstance(target, ast.FuncProto) or isinstance(target, basetype.LibFunc):
+            if target.spec.static:
+                return lambda: target
+            name = target.name
+            def evalMemberFunc():
+                this = stacks[-1].this if len(stacks) > 0 else None
+                assert this
+                return this.getValue(name)
+            return evalMemberFunc
+        getLocal = self.compileGetLocal(identifier)
+        def evalVar():
+            return getLocal().getValue()
+        return evalVar
+    def compileGetLocal(self, identifier):
+        # the holder of a variable, read straight from the slot when the current frame declares it
+        var = identifier.getTarget()
+        name = identifier.name
+        stacks = self.interpreter.stacks
+        slotRoot = getattr(var, 'slotRoot', None)
+        if slotRoot is None:
+            return lambda: stacks[-1].getLocal(var, name)
+        slot = var.slot
+        def getLocal():
+            stack = stacks[-1]
+            if stack.slotRoot is slotRoot:
+                val = stack.slots[slot]
+                if val:
+                    return val
+            return stack.getLocal(var, name)
+        return getLocal
+    def compile_PrimitiveLiteral(self, literal):
+        value = literal.value
+        return lambda: value
+    def compile_Nil(self, nil):
+        nilValue = self.interpreter.nilValue
+        return lambda: nilValue
+    def compile_This(self, this):
+        stacks = self.interpreter.stacks
+        def evalThis():
+            ret = stacks[-1].this if len(stacks) > 0 else None
+            assert ret, (this, this.getOwnerFunc(), this.getOwnerClass())
+            return ret
+        return evalThis
+    def compile_ArgumentPlaceholder(self, param):
+        implicit_args_stack = self.interpreter.implicit_args_stack
+        sequence = param.sequence
+        return lambda: implicit_args_stack[0][sequence]
+    def compile_StringEvaluation(self, se):
+        return self.compile(se.literal if se.evaluation is None else se.evaluation)
+    def compile_NamedExpressionItem(self, item):
+        return self.compile(item.value)
+    def compile_CaseEntryExpr(self, caseexpr):
+        return self.compile(caseexpr.expr)
+    def compile_CaseEntryStmt(self, casestmt):
+        return self.compile(casestmt.body)
+    def compile_ListLiteral(self, literal):
+        values = [self.compile(val) for val in literal.values]
+        return lambda: [val() for val in values]
+    def compile_TupleLiteral(self, literal):
+        values = [self.compile(val) for val in literal.values]
+        return lambda: tuple([val() for val in values])
+    def compile_DictLiteral(self, literal):
+        items = [(self.compile(item.key), self.compile(item.value)) for item in literal.values]
+        return lambda: dict([(key(), val()) for key, val in items])
+    def compile_ExprList(self, exprlist):
+        exprs = [self.compile(expr) for expr in exprlist.exprs]
+        return lambda: [expr() for expr in exprs]
+    def compile_IfElseExpr(self, expr):
+        condition = self.compile(expr.condition)
+        truePart = self.compile(expr.truePart)
+        falsePart = self.compile(expr.falsePart)
+        nilValue = self.interpreter.nilValue
+        def evalIfElseExpr():
+            cond = condition()
+            assert cond is not None, ('evaluate_IfElseExpr', expr, expr.condition, cond)
+            if cond and cond != nilValue:
+                return truePart()
+            return falsePart()
+        return evalIfElseExpr
+    def compile_Subscript(self, subscript):
+        collection = self.compile(subscript.collection)
+        key = self.compile(subscript.key)
+        def evalSubscript():
+            coll = collection()
+            k = key()
+            if isinstance(coll, list):
+                assert isinstance(k, int) and k < len(coll), ('evaluate_Subscript invalid list coll', subscript, subscript.collection, coll, k, len(coll), subscript.getOwnerFunc())
+            elif isinstance(coll, dict):
+                assert k in coll, ('evaluate_Subscript invalid dict coll', subscript, subscript.collection, coll, k, subscript.getOwnerFunc())
+            elif isinstance(coll, str):
+                assert isinstance(k, int) and k < len(coll), ('evaluate_Subscript invalid str coll', subscript, subscript.collection, coll, k, subscript.getOwnerFunc())
+            else:
+                assert False, ('evaluate_Subscript invalid coll', subscript, subscript.collection, coll, k, subscript.getOwnerFunc())
+            return coll[k]
+        return evalSubscript
+    def compile_Slicing(self, slicing):
+        nilValue = self.interpreter.nilValue
+        collection = self.compile(slicing.collection)
+        start = self.compile(slicing.start) if slicing.start and slicing.start != nilValue else None
+        stop = self.compile(slicing.stop) if slicing.stop and slicing.stop != nilValue else None
+        def evalSlicing():
+            seq = collection()
+            return seq[start() if start else None:stop() if stop else None]
+        return evalSlicing
+    def compile_TypeCast(self, typecast):
+        source = self.compile(typecast.source)
+        nilValue = self.interpreter.nilValue
+        def evalTypeCast():
+            src = source()
+            if src is None or src == nilValue:
+                return nilValue
+            if ast.isSubClass(src.cls, typecast.type.getTarget()):
+                return src
+            return nilValue
+        return evalTypeCast
+    def compile_UnaryOp(self, expr):
+        typeClass = getTypeClassOf(expr.operand)
+        evalUnaryOp = getattr(typeClass, 'evaluateUnaryOp', None)
+        if evalUnaryOp is None:
+            return self.compileVisit(expr)
+        operand = self.compile(expr.operand)
+        interpreter = self.interpreter
+        op = expr.op
+        return lambda: evalUnaryOp(interpreter, op, operand())
+    def compile_BinaryOp(self, expr):
+        op = expr.op
+        if op in ['not-in', 'in']:
+            typeClass = getTypeClassOf(expr.right)
+            evalContains = getattr(typeClass, 'eval_not_contains' if op == 'not-in' else 'eval_contains', None)
+            if evalContains is None:
+                return self.compileVisit(expr)
+            left = self.compile(expr.left)
+            right = self.compile(expr.right)
+            def evalContainsOp():
+                l = left()
+                return evalContains(right(), l)
+            return evalContainsOp
+        typeClass = getTypeClassOf(expr.left)
+        if typeClass is None:
+            return self.compileVisit(expr)
+        evalBinaryOp = getattr(type(typeClass), 'evaluateBinaryOp', None)
+        evalBinaryOp = getattr(evalBinaryOp, 'im_func', None)
+        ops = getattr(typeClass, 'ops', {})
+        if evalBinaryOp in simpleBinaryOps and op in ops:
+            left = self.compile(expr.left)
+            right = self.compile(expr.right)
+            opfunc = ops[op]
+            return lambda: opfunc(left(), right())
+        if evalBinaryOp is builtins.StringClass.evaluateBinaryOp.im_func and op in ops:
+            left = self.compile(expr.left)
+            right = self.compile(expr.right)
+            opfunc = ops[op]
+            if op != '%':
+                return lambda: opfunc(left(), right())
+            def evalFormat():
+                l = left()
+                r = right()
+                if not isinstance(r, list) and not isinstance(r, tuple):
+                    r = [r]
+                return opfunc(l, *r)
+            return evalFormat
+        if evalBinaryOp is builtins.BoolClass.evaluateBinaryOp.im_func and op in ['and', 'or']:
+            left = self.compile(expr.left)
+            right = self.compile(expr.right)
+            opfunc = ops[op]
+            if op == 'and':
+                def evalAnd():
+                    l = left()
+                    if not l:
+                        return False
+                    return opfunc(l, right())
+                return evalAnd
+            def evalOr():
+                l = left()
+                if l:
+                    return True
+                return opfunc(l, right())
+            return evalOr
+        if evalBinaryOp is ast.AstNode.evaluateBinaryOp.im_func and op in ['==', '!=', 'and', 'or'] and \
+                ast.findInvokeHandler(self.interpreterClass, 'evaluateBinaryOp', typeClass.__class__) in \
+                [Interpreter.evaluateBinaryOp_ClassDef.im_func, Interpreter.evaluateBinaryOp_EnumDef.im_func]:
+            left = self.compile(expr.left)
+            right = self.compile(expr.right)
+            return self.compileRefCompare(op, left, right)
+        interpreter = self.interpreter
+        evalBinaryOp = typeClass.evaluateBinaryOp
+        left = expr.left
+        right = expr.right
+        return lambda: evalBinaryOp(interpreter, op, left, right)
+    def compileRefCompare(self, op, left, right):
+        if op == '==':
+            def evalEqual():
+                l = left()
+                r = right()
+                if r is None:
+                    return l is None
+                return l == r
+            return evalEqual
+        if op == '!=':
+            def evalNotEqual():
+                l = left()
+                r = right()
+                if r is None:
+                    return l is not None
+                return l != r
+            return evalNotEqual
+        if op == 'and':
+            def evalAnd():
+                l = left()
+                r = right()
+                return l and r
+            return evalAnd
+        def evalOr():
+            l = left()
+            r = right()
+            return l or r
+        return evalOr
+    def compile_AttrRef(self, attr):
+        obj = self.compile(attr.object)
+        evaluateAttrOf = self.interpreter.evaluateAttrOf
+        return lambda: evaluateAttrOf(obj(), attr)
+    def compile_Closure(self, c):
+        stacks = self.interpreter.stacks
+        getBody = self.getBody
+        body = c.body
+        def evalClosure():
+            assert c.stack, ('evaluate_Closure nil stack', c, c.owner, c.getOwnerFunc())
+            getBody(body)()
+            return stacks[-1].returnValue
+        return evalClosure
+    def compile_Call(self, callinfo):
+        caller = callinfo.caller
+        if isDefaultMethod(caller, 'evaluateCall', ast.AstNode):
+            handler = ast.findInvokeHandler(self.interpreterClass, 'evaluateCall', caller.__class__)
+            if handler is Interpreter.evaluateCall_Identifier.im_func:
+                return self.compileCallIdentifier(caller, callinfo)
+            if handler is Interpreter.evaluateCall_AttrRef.im_func:
+                return self.compileCallAttrRef(caller, callinfo)
+        interpreter = self.interpreter
+        return lambda: caller.evaluateCall(interpreter, callinfo)
+    def compileCallFuncDefEvaluator(self, callinfo):
+        # FuncDefEvaluator.evaluateCall without the discarded evaluation of `this`
+        interpreter = self.interpreter
+        evalFunc = interpreter.evalFunc
+        args = self.compileArgs(callinfo.args)
+        hasNamedArgs = len(callinfo.namedArgs) > 0
+        callerObject = None
+        if isinstance(callinfo.caller, ast.AttrRef) and not self.isPureExpr(callinfo.caller.object):
+            callerObject = self.compile(callinfo.caller.object)
+        def callFuncDefEvaluator(fe):
+            if type(fe) is not FuncDefEvaluator or fe.func.injection_cls or hasNamedArgs:
+                return fe.evaluateCall(interpreter, callinfo)
+            if callerObject and not fe.func.spec.static:
+                callerObject()
+            return evalFunc(fe.func, fe.clsvar, [arg() for arg in args], {})
+        return callFuncDefEvaluator
+    def compileCallIdentifier(self, identifier, callinfo):
+        interpreter = self.interpreter
+        stacks = interpreter.stacks
+        target = identifier.getTarget()
+        if isinstance(target, ast.ClassDef) or isinstance(target, basetype.LibClass):
+            return self.compileCallTarget(target, callinfo)
+        if isinstance(target, ast.UserType):
+            realTarget = target.getTarget()
+            if realTarget and not isinstance(realTarget, ast.UserType):
+                return self.compileCallTarget(realTarget, callinfo)
+            return lambda: identifier.evaluateCall(interpreter, callinfo)
+        if isinstance(target, ast.FuncDef) or isinstance(target, ast.FuncProto) or isinstance(target, basetype.LibFunc):
+            targetCall = self.compileCallTarget(target, callinfo)
+            if target.spec.static or target.cls is None:
+                return targetCall
+            name = identifier.name
+            callFuncDefEvaluator = self.compileCallFuncDefEvaluator(callinfo)
+            def evalCallMethod():
+                this = stacks[-1].this if len(stacks) > 0 else None
+                if this is None:
+                    return targetCall()
+                func = this.getVar(name)
+                assert func, ('evaluateCall_Identifier FuncDef or FuncProto or LibFunc', identifier, identifier.getTarget(), callinfo, interpreter.getThis(), callinfo.getOwnerFunc())
+                return callFuncDefEvaluator(func)
+            return evalCallMethod
+        getLocal = self.compileGetLocal(identifier)
+        callFuncDefEvaluator = self.compileCallFuncDefEvaluator(callinfo)
+        def evalCallVar():
+            return callFuncDefEvaluator(getLocal().getValue())
+        return evalCallVar
+    def compileCallAttrRef(self, attr, callinfo):
+        interpreter = self.interpreter
+        target = attr.getTarget()
+        if isinstance(target, (ast.FuncDef, ast.FuncProto)):
+            if (not target.spec.static) or target.injection_cls:
+                return self.compileCallMethod(attr, callinfo)
+        if isinstance(target, libs.ScriptFunc) and (not target.spec.static):
+            obj = self.compile(callinfo.caller.object)
+            methodname = 'ScriptMethod_' + callinfo.caller.ref
+            args = self.compileArgs(callinfo.args)
+            namedArgs = [(arg.name, self.compile(arg.value)) for arg in callinfo.namedArgs]
+            def evalScriptMethod():
+                callerfunc = getattr(obj(), methodname)
+                assert callerfunc, (callinfo, callinfo.caller.object, callerfunc)
+                argvals = [arg() for arg in args]
+                named_args = dict([(name, val()) for name, val in namedArgs])
+                return callerfunc(*argvals, **named_args)
+            return evalScriptMethod
+        return self.compileCallTarget(target, callinfo)
+    def compileCallMethod(self, attr, callinfo):
+        # the method is looked up in the inline cache of the site, see Interpreter.evaluateCall_AttrRef
+        interpreter = self.interpreter
+        findCachedMember = interpreter.findCachedMember
+        evaluateAttrOf = interpreter.evaluateAttrOf
+        evalFunc = interpreter.evalFunc
+        obj = self.compile(attr.object)
+        pureObject = self.isPureExpr(attr.object)
+        args = self.compileArgs(callinfo.args)
+        hasNamedArgs = len(callinfo.namedArgs) > 0
+        callFuncDefEvaluator = self.compileCallFuncDefEvaluator(callinfo)
+        def evalMethodCall():
+            this = obj()
+            if type(this) is ClassDefEvaluator and not hasNamedArgs:
+                member = findCachedMember(attr, this)
+                if isinstance(member, ast.FuncDef) and not member.injection_cls:
+                    if not pureObject and not member.spec.static:
+                        obj()
+                    return evalFunc(member, this, [arg() for arg in args], {})
+            return callFuncDefEvaluator(evaluateAttrOf(this, attr))
+        return evalMethodCall
+    def compileCallTarget(self, target, callinfo):
+        # target.evaluateCall(interpreter, callinfo) for a target known at compile time
+        interpreter = self.interpreter
+        stacks = interpreter.stacks
+        if isDefaultMethod(target, 'evaluateCall', ast.AstNode):
+            handler = ast.findInvokeHandler(self.interpreterClass, 'evaluateCall', target.__class__)
+            if handler is Interpreter.evaluateCall_FuncDef.im_func and not target.injection_cls:
+                evalFunc = interpreter.evalFunc
+                args = self.compileArgs(callinfo.args)
+                namedArgs = self.compileNamedArgs(callinfo.namedArgs)
+                if target.spec.static:
+                    return lambda: evalFunc(target, None, [arg() for arg in args], dict([(name, val()) for name, val in namedArgs]))
+                if isinstance(callinfo.caller, ast.AttrRef):
+                    obj = self.compile(callinfo.caller.object)
+                    def evalMethodCall():
+                        this = obj()
+                        return evalFunc(target, this, [arg() for arg in args], dict([(name, val()) for name, val in namedArgs]))
+                    return evalMethodCall
+                def evalFuncCall():
+                    this = stacks[-1].this
+                    return evalFunc(target, this, [arg() for arg in args], dict([(name, val()) for name, val in namedArgs]))
+                return evalFuncCall
+            if handler is Interpreter.evaluateCall_ClassDef.im_func:
+                evalConstructor = interpreter.evalConstructor
+                args = self.compileArgs(callinfo.args)
+                namedArgs = self.compileNamedArgs(callinfo.namedArgs)
+                return lambda: evalConstructor(target, [arg() for arg in args], dict([(name, val()) for name, val in namedArgs]), None)
+        elif isDefaultMethod(target, 'evaluateCall', basetype.LibFunc) and isinstance(callinfo.caller, ast.AttrRef):
+            evaluator = target.evaluator if target.evaluator else getattr(target.cls, 'eval_' + target.name, None)
+            if evaluator:
+                obj = self.compile(callinfo.caller.object)
+                args = self.compileArgs(callinfo.args)
+                def evalLibFunc():
+                    caller = obj()
+                    return evaluator(caller, *[arg() for arg in args])
+                return evalLibFunc
+        elif isDefaultMethod(target, 'evaluateCall', libs.ScriptFunc):
+            evaluator = target.evaluator
+            args = self.compileArgs(callinfo.args)
+            if target.spec.static:
+                return lambda: evaluator(interpreter, *[arg() for arg in args])
+            if isinstance(callinfo.caller, ast.AttrRef):
+                obj = self.compile(callinfo.caller.object)
+                def evalScriptFunc():
+                    argvals = [arg() for arg in args]
+                    return evaluator(obj(), *argvals)
+                return evalScriptFunc
+        return lambda: target.evaluateCall(interpreter, callinfo)
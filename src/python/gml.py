@@ -6,16 +6,24 @@ import re
 import xutils
 from xutils import Table, printException, initLogging, createLogger
 from parser import codeparser
+import parsecache
+from parsecache import ParseCache
+from metrics import PhaseMetrics, countAstNodes
+from census import ObjectCensus
+from profiler import FuncNames, FuncProfiler, SamplingProfiler
 import os.path
 from preprocessor import ScriptProcessor, PreExpander, OwnerInitializer
 from preprocessor import NameCacher, NameResolver
 from interpreter import Interpreter
+from closurecompiler import ClosureCompiler
 import ast
 import os
 import scripts
 import libs
 import logging
 import time
+import multiprocessing
+import contextlib
 
 class ProjectConfig(object):
     def __init__(self):
@@ -31,29 +39,76 @@ class Project(ast.AstNode, ast.AstBlockContext):
         self.pkg.setOwner(self)
         self.config = ProjectConfig()
         self.scripts = {}
+        # script path -> script, scripts are only registered while loading the libs
+        self.scriptIndex = {}
+        # the innermost entry lists the passes already run on the item being caught up
         self.visitorStack = [[]]
+        # new items queued by deferNewItems, and how many items went through the completed passes
+        self.deferredItems = None
+        self.newItemCount = 0
+        self.deferredItemCount = 0
+        self.catchUpBatchCount = 0
+        self.catchUpVisitCount = 0
+        # (match site or function name, runtime class) -> dispatch result, see Interpreter.matchClasses
+        self.dispatchCache = {}
+        self.classHierarchy = ast.classHierarchy
+        # resolved types shared by all the nodes having the same type, see AstNode.setupType
+        self.internedTypes = {}
     def setupNewItem(self, item, owneritem, currentVisitor):
         assert item != None, ("Project.setupNewItem", item, owneritem, currentVisitor)
         if owneritem != None:
             item.setOwner(owneritem)
         self.visitNewItem(item, currentVisitor)
     def visitNewItem(self, item, currentVisitor=None):
-        latestVisitors = self.visitorStack[0]
-        self.visitorStack.insert(0, [])
+        self.newItemCount += 1
+        if self.deferredItems is not None:
+            self.deferredItemCount += 1
+            self.deferredItems.append((item, self.visitorStack[-1][:], currentVisitor))
+            return
+        self.catchUpItem(item, self.visitorStack[-1], currentVisitor)
+    def catchUpItem(self, item, latestVisitors, currentVisitor):
+        if isinstance(item, ast.ClassDef):
+            self.dispatchCache.clear()
+            self.classHierarchy.invalidate(False)
+        self.visitorStack.append([])
         for visitor in latestVisitors:
             item.visit(visitor)
-            self.visitorStack[0].append(visitor)
+            self.visitorStack[-1].append(visitor)
+        self.catchUpVisitCount += len(latestVisitors)
         if currentVisitor != None:
             item.visit(currentVisitor)
-        del self.visitorStack[0]
+        self.visitorStack.pop()
+    @contextlib.contextmanager
+    def deferNewItems(self):
+        '''
+        queue the items created in the block and catch them up in creation order when the outermost block ends,
+        for producers that add several items which do not depend on each other having been visited.
+        '''
+        if self.deferredItems is not None:
+            yield
+            return
+        self.deferredItems = []
+        try:
+            yield
+        finally:
+            items = self.deferredItems
+            self.deferredItems = None
+        if items:
+            self.catchUpBatchCount += 1
+        for item, latestVisitors, currentVisitor in items:
+            self.catchUpItem(item, latestVisitors, currentVisitor)
     def loadLib(self):
         scripts.loadScripts(self)
         self.libUnits = libs.loadAll(self)
     def findScript(self, path):
-        item = self.scripts
-        for p in path:
-            item = item[p]
-        assert(item)
+        key = tuple(path)
+        item = self.scriptIndex.get(key)
+        if item is None:
+            item = self.scripts
+            for p in path:
+                item = item[p]
+            assert(item)
+            self.scriptIndex[key] = item
         return item
     def getPackage(self, path):
         return self.pkg.getPackage(path)
@@ -75,9 +130,27 @@ class Project(ast.AstNode, ast.AstBlockContext):
         print('Project.loadPrelude ok', pkg, self.symbols)
 
 def process(opts):
+    metrics = PhaseMetrics()
+    if opts.census:
+        metrics.census = ObjectCensus()
+    if opts.count_dispatch:
+        ast.enableDispatchCounting()
+    try:
+        return processUnits(opts, metrics)
+    finally:
+        if ast.dispatchCounter:
+            ast.dispatchCounter.dump()
+        if opts.print_metrics:
+            metrics.dump()
+        if opts.metrics:
+            metrics.write(opts.metrics)
+
+def processUnits(opts, metrics):
     print('start with files', opts.filename)
     project = Project()
-    project.loadLib()
+    metrics.project = project
+    with metrics.measure(metrics.addPhase('loadLib')):
+        project.loadLib()
     project.opts = opts
     codeunits = []
     gmlparser = codeparser
@@ -89,14 +162,17 @@ def process(opts):
     visitors.append(OwnerInitializer())
     visitors.append(PreExpander())
     visitors += [NameCacher(), NameResolver(), ScriptProcessor(), Resolver()]
-    for filename in opts.filename:
-        print('try parse file', filename)
+    parseCache = openParseCache(opts)
+    phase = metrics.addPhase('parse')
+    with metrics.measure(phase):
+        units = parseFiles(opts, gmlparser, parseCache, metrics, phase)
+    if opts.metrics or opts.print_metrics:
+        phase['nodes'] = sum([unit['nodes'] for unit in phase['units']])
+    for filename, ast in zip(opts.filename, units):
         codeunit = Table()
         codeunits.append(codeunit)
         codeunit.filename = filename
         codeunit.parser = gmlparser
-        print('codeunit parse', filename, codeunit.filename)
-        ast = codeunit.parser.parse(open(filename).read(), filename)
         print('codeunit parse ok', filename, ast)
         ast.pkg = project.getPackage(ast.packageDef.path)
         ast.lib = None
@@ -116,49 +192,132 @@ def process(opts):
         if not os.path.exists(astDir):
             os.makedirs(astDir)
         codeunit.ast.setOwner(codeunit.ast.pkg)
+    if parseCache:
+        parseCache.evict()
+        if opts.print_metrics:
+            print('parse cache hits=%d misses=%d evicted=%d' % (parseCache.hits, parseCache.misses, parseCache.evicted))
     for unit in project.libUnits:
         unit.project = project
         unit.pkg = project.getPackage(unit.packageDef.path)
         unit.setOwner(unit.pkg)
-    project.visitorStack[0] = []
+    project.visitorStack[-1] = []
     i = 0
     analyzeStartTime = time.time()
     for i in range(len(visitors)):
         visitor = visitors[i]
         j = 0
         visitor.project = project
-        for unit in project.libUnits:
-            startTime = time.time()
-            visitor.visit(unit)
-            usedTime = time.time() - startTime
-            print('visit lib unit ok', unit.name, usedTime, unit)
-        for codeunit in codeunits:
-            j += 1
-            # print('visit ast', visitor.name, codeunit.ast.name, codeunit.ast.filename, i, j, codeunit.name)
-            assert(codeunit.ast.filename == codeunit.filename)
-            assert(codeunit.ast.name == codeunit.name)
-            startTime = time.time()
-            visitor.visit(codeunit.ast)
-            usedTime = time.time() - startTime
-            print('visit code unit ok', codeunit.ast.name, usedTime, codeunit.ast)
-            # print('visit ast ok.', codeunit.ast.name, codeunit.ast.filename, visitor, codeunit, i, j, codeunit.name, codeunit, codeunit.ast)
-            assert(codeunit.ast.filename == codeunit.filename)
-            assert(codeunit.ast.name == codeunit.name)
-            astfilename = os.path.join(codeunit.ast.package_directory, '%s.%s.txt' % (codeunit.ast.name, visitor.opname))
-            # print('open file astfilename', astfilename, codeunit.ast.package_directory, codeunit.ast.name)
-        if visitor.opname == 'cacheName':
-            project.initPrelude()
-            project.loadPrelude()
-        project.visitorStack[0].append(visitor)
+        phase = metrics.addPhase(visitor.opname)
+        with metrics.measure(phase, visitor):
+            for unit in project.libUnits:
+                with metrics.measure(metrics.addUnit(phase, unit.name), visitor) as m:
+                    visitor.visit(unit)
+                if opts.print_metrics:
+                    print('visit lib unit ok', unit.name, m['wall'])
+            for codeunit in codeunits:
+                j += 1
+                # print('visit ast', visitor.name, codeunit.ast.name, codeunit.ast.filename, i, j, codeunit.name)
+                assert(codeunit.ast.filename == codeunit.filename)
+                assert(codeunit.ast.name == codeunit.name)
+                with metrics.measure(metrics.addUnit(phase, codeunit.ast.filename), visitor) as m:
+                    visitor.visit(codeunit.ast)
+                if opts.print_metrics:
+                    print('visit code unit ok', codeunit.ast.name, m['wall'])
+                # print('visit ast ok.', codeunit.ast.name, codeunit.ast.filename, visitor, codeunit, i, j, codeunit.name, codeunit, codeunit.ast)
+                assert(codeunit.ast.filename == codeunit.filename)
+                assert(codeunit.ast.name == codeunit.name)
+                astfilename = os.path.join(codeunit.ast.package_directory, '%s.%s.txt' % (codeunit.ast.name, visitor.opname))
+                # print('open file astfilename', astfilename, codeunit.ast.package_directory, codeunit.ast.name)
+            if visitor.opname == 'cacheName':
+                project.initPrelude()
+                project.loadPrelude()
+        project.visitorStack[-1].append(visitor)
     print('analyze ok', time.time() - analyzeStartTime)
+    if opts.print_metrics:
+        print('new items=%d deferred=%d batches=%d catch-up visits=%d' % (project.newItemCount, project.deferredItemCount, project.catchUpBatchCount, project.catchUpVisitCount))
     if opts.interpreter:
         evalStartTime = time.time()
-        astInterpreter.evaluateGlobalVar(codeunits)
-        ret = astInterpreter.execute('gml.runMain'.split('.'), sys.argv[:])
+        if opts.compile_closures:
+            astInterpreter.compiler = ClosureCompiler(astInterpreter)
+        # one naming for both profilers, so their outputs can be matched up
+        names = FuncNames()
+        if opts.gml_profile:
+            astInterpreter.profiler = FuncProfiler(names)
+        sampler = SamplingProfiler(astInterpreter, opts.gml_sample_interval, names) if opts.gml_sample else None
+        if sampler:
+            sampler.start()
+        try:
+            with metrics.measure(metrics.addPhase('evaluateGlobalVar'), astInterpreter):
+                astInterpreter.evaluateGlobalVar(codeunits)
+            with metrics.measure(metrics.addPhase('execute'), astInterpreter):
+                ret = astInterpreter.execute(opts.entry.split('.'), opts.args[:])
+        finally:
+            if sampler:
+                sampler.stop()
+        if sampler:
+            sampler.write(opts.gml_sample)
+            print('gml samples written to %s samples=%d empty=%d' % (opts.gml_sample, sampler.sampleCount, sampler.emptyCount))
+        if astInterpreter.profiler:
+            astInterpreter.profiler.write(opts.gml_profile)
+            print('gml profile written to %s' % opts.gml_profile)
+        if astInterpreter.compiler:
+            print('closure compiler compiled=%d visited=%d bodies=%d' % (astInterpreter.compiler.compiledCount, astInterpreter.compiler.visitedCount, len(astInterpreter.compiler.bodies)))
         print('evaluate ok', time.time() - evalStartTime)
         return ret
     return True
 
+def openParseCache(opts):
+    if not opts.parsecache:
+        return None
+    error = parsecache.prepareDirectory(opts.parsecache)
+    if error:
+        print('parse cache disabled, %s: %s' % (opts.parsecache, error))
+        return None
+    return ParseCache(opts.parsecache, opts.parsecache_maxsize, opts.parsecache_maxage)
+
+def parseFiles(opts, gmlparser, parseCache, metrics, phase):
+    texts = [open(filename).read() for filename in opts.filename]
+    entries = [metrics.addUnit(phase, filename) for filename in opts.filename]
+    units = [None] * len(texts)
+    if parseCache:
+        for i in range(len(texts)):
+            with metrics.measure(entries[i]):
+                units[i] = parseCache.lookup(texts[i])
+            entries[i]['cached'] = units[i] is not None
+    missing = [i for i in range(len(units)) if units[i] is None]
+    if opts.jobs > 1 and len(missing) > 1:
+        print('parse files with %d jobs' % opts.jobs, len(missing))
+        pool = multiprocessing.Pool(min(opts.jobs, len(missing)))
+        try:
+            results = pool.map(parsecache.parseUnitData, [(opts.filename[i], texts[i]) for i in missing])
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        for i, (data, wall, cpu) in zip(missing, results):
+            with metrics.measure(entries[i]):
+                units[i] = parsecache.loadUnit(data)
+                if parseCache:
+                    parseCache.store(texts[i], data)
+            # the parse itself ran in a worker, which timed it
+            entries[i]['wall'] += wall
+            entries[i]['cpu'] += cpu
+            entries[i]['worker'] = True
+    else:
+        for i in missing:
+            print('codeunit parse', opts.filename[i])
+            with metrics.measure(entries[i]):
+                units[i] = gmlparser.parse(texts[i], opts.filename[i])
+                if parseCache:
+                    parseCache.store(texts[i], parsecache.dumpUnit(units[i]))
+    if opts.metrics or opts.print_metrics:
+        # parsing runs no visitor, the nodes are counted in the parsed units instead
+        for entry, unit in zip(entries, units):
+            entry['nodes'] = countAstNodes(unit)
+    return units
+
 def globExtRecursively(rootdir, ext):
     # print('globExtRecursively', rootdir, ext)
     allfiles = os.listdir(rootdir)
@@ -174,17 +333,52 @@ def globExtRecursively(rootdir, ext):
     return files
 
 
+def popOption(argv, name, default=None, convert=str):
+    # options of gml.py are removed from argv, the remaining args are passed to gml.runMain
+    if name not in argv:
+        return default
+    i = argv.index(name)
+    assert i + 1 < len(argv), ('option needs a value', name, argv)
+    value = convert(argv[i + 1])
+    del argv[i:i + 2]
+    return value
+
+def popFlag(argv, name):
+    if name not in argv:
+        return False
+    argv.remove(name)
+    return True
+
 def getConfig():
     rootdir = os.path.dirname(__file__)
     config = Table()
-    config.classpath = os.path.join(rootdir, '../gml')
     # config.libpath = os.path.join(rootdir, 'cpp/lib')
     config.gmllib = os.path.join(rootdir, '../libs/gml')
-    config.filename = globExtRecursively(config.classpath, '.gml')
     config.gmllibfiles = globExtRecursively(config.gmllib, '.gml')
     config.lib_files = []
     config.outputdir = '/tmp'
     config.interpreter = True
+    config.parsecache_maxsize = 64 * 1024 * 1024
+    config.parsecache_maxage = 30 * 24 * 3600
+    argv = sys.argv[:]
+    # the gml program run by the interpreter, the self hosted compiler by default
+    config.classpath = popOption(argv, '--classpath', os.path.join(rootdir, '../gml'))
+    config.entry = popOption(argv, '--entry', 'gml.runMain')
+    config.filename = globExtRecursively(config.classpath, '.gml')
+    config.jobs = popOption(argv, '-j', 1, int)
+    # the parse cache is off unless a directory, or the per user default, is given
+    config.parsecache = popOption(argv, '--parse-cache')
+    if popFlag(argv, '--default-parse-cache'):
+        config.parsecache = parsecache.getDefaultDirectory()
+    config.compile_closures = popFlag(argv, '--closures')
+    config.metrics = popOption(argv, '--metrics')
+    config.print_metrics = popFlag(argv, '--print-metrics')
+    config.gml_profile = popOption(argv, '--gml-profile')
+    config.census = popFlag(argv, '--census')
+    config.count_dispatch = popFlag(argv, '--count-dispatch')
+    config.gml_sample = popOption(argv, '--gml-sample')
+    config.gml_sample_interval = popOption(argv, '--gml-sample-interval', 0.005, float)
+    config.args = argv
     config.filename += config.gmllibfiles
     print 'getConfig: files:', config.filename
     print 'getConfig: libs:', config.lib_files
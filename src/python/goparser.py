@@ -1,7 +1,7 @@
 import sys
 import ply.lex
 import ply.yacc
-from lex import LexLogger
+from lex import LexLogger, makeTableName
 import traceback
 from ast import *
 
@@ -818,24 +818,32 @@ class GoParser(object):
         traceback.print_stack()
         sys.exit(100)
 
-    def build(self, start):
+    def build(self, start=None):
+        if start is not None:
+            self.start = start
         if self.lexer is None:
             self.lexer = GoLexer()
         self.lexer.build()
-        # optimization may cause problem, setting 'optimize' to False could solve the problem, then restore it to True
-        # it seems that sometimes when 'optimize' is setted to True, the cache files are not updated when source files are changed
-        self.parser = ply.yacc.yacc(module=self, optimize=False, tabmodule='goparsetab', debugfile='goparser.out', debug=False, start=start, errorlog=LexLogger(sys.stderr))#, debuglog=LexLogger(sys.stderr))
-    def __init__(self, lexer=None):
+        # the table module name is keyed by a grammar hash, so 'optimize' can't pick up stale tables
+        tabmodule = makeTableName('goparsetab', self, self.start)
+        self.parser = ply.yacc.yacc(module=self, optimize=True, tabmodule=tabmodule, debug=False, start=self.start, errorlog=LexLogger(sys.stderr))#, debuglog=LexLogger(sys.stderr))
+    def __init__(self, lexer=None, start='go_decl'):
         self.lexer = lexer
         self.parser = None
+        self.start = start
     def parse(self, s, sourcename=None):
         # print('GoParser.parse', s)
+        if self.parser is None:
+            self.build()
         self.lexer.lexer.lineno = 0
         self.sourcename = sourcename
         return self.parser.parse(s, lexer=self.lexer.lexer, debug=False, tracking=False)
 
 godeclparser = GoParser()
-godeclparser.build('go_decl')
+
+def buildTables():
+    if godeclparser.parser is None:
+        godeclparser.build()
 
 if __name__ == '__main__':
     godeclparser.parse(r"const MaxRune='\U0010FFFF'")
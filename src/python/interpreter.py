@@ -14,20 +14,7 @@ def calcClassMatchingDigree(sourceCls, targetCls):
     if targetCls is None:
         # default case
         return sys.maxint
-    if sourceCls is targetCls:
-        # print('calcClassMatchingDigree exact match', sourceCls, targetCls)
-        return 0
-    minDegree = sys.maxint
-    for base in sourceCls.bases:
-        degree = calcClassMatchingDigree(base.getTarget(), targetCls)
-        if degree == 0:
-            minDegree = degree + 1
-            # print('calcClassMatchingDigree exact match in base', sourceCls, base, targetCls)
-            break
-        elif degree < minDegree:
-            minDegree = degree + 1
-    # print('calcClassMatchingDigree result', sourceCls, targetCls, minDegree)
-    return minDegree
+    return ast.classHierarchy.getEntry(sourceCls).depths.get(targetCls, sys.maxint)
 
 def calcClassFuncMatchingDigree(sourceCls, funcname):
     # print('calcClassFuncMatchingDigree', sourceCls, funcname)
@@ -126,7 +113,11 @@ class EvaluatorStack(object):
         self.this = this
         self.unit = f.getOwnerUnit()
         # self.global_scope = GlobalScope(self.unit)# if env is None else None
-        self.scopes = [this, self.unit.globalScope] if this else [self.unit.globalScope]
+        # innermost scope last
+        self.scopes = [self.unit.globalScope, this] if this else [self.unit.globalScope]
+        # locals allocated by LocalSlotAllocator for the function
+        self.slotRoot = f.slotRoot
+        self.slots = [None] * f.frameSize
         self.flowFlag = FlowFlags.NORMAL
         self.returnValue = nilVal
         # env is the variable context for closure
@@ -135,10 +126,28 @@ class EvaluatorStack(object):
         return 'EvaluatorStack(%s)' % self.func.shortname()
     def addVar(self, name, val):
         # print('EvaluatorStack.addVar', name, val, self, self.this, self.scopes)
-        return self.scopes[0].addVar(name, val)
+        return self.scopes[-1].addVar(name, val)
+    def addLocal(self, var, val):
+        # print('EvaluatorStack.addLocal', var, val, self)
+        if var.slotRoot is not None and var.slotRoot is self.slotRoot:
+            self.slots[var.slot] = val
+            return
+        # closures evaluated in a frame of another function declare their variables by name
+        self.scopes[-1].addVar(var.name, val)
+    def getLocal(self, var, name):
+        slotRoot = getattr(var, 'slotRoot', None)
+        if slotRoot is not None:
+            stack = self
+            while stack:
+                if stack.slotRoot is slotRoot:
+                    val = stack.slots[var.slot]
+                    if val:
+                        return val
+                stack = stack.env
+        return self.getVar(name)
     def getVar(self, name):
         # print('EvaluatorStack.getVar', name)
-        for scope in self.scopes:
+        for scope in reversed(self.scopes):
             # print('EvaluatorStack.getVar scope', name, scope, type(scope), self, self.scopes)
             var = scope.getVar(name)
             if var:
@@ -154,6 +163,61 @@ class EvaluatorStack(object):
     def setValue(self, name, val):
         return self.getVar(name).setValue(val)
 
+class LocalSlotAllocator(ast.AstVisitor):
+    '''
+    assigns the params and locals of a function, including those declared in its closures, slots in the function frame.
+    '''
+    def __init__(self):
+        ast.AstVisitor.__init__(self)
+        self.name = 'localSlotAllocator'
+        self.opname = 'allocateSlot'
+    def allocate(self, func):
+        # self.logger.debug('allocate', func)
+        self.func = func
+        self.frameSize = 0
+        self.bodies = []
+        self.closures = []
+        self.caseblocks = []
+        for param in func.spec.params:
+            self.addSlot(param)
+        self.visitChild(func.body, func)
+        func.slotRoot = func
+        func.frameSize = self.frameSize
+        for closure in self.closures:
+            closure.slotRoot = func
+            closure.frameSize = self.frameSize
+        for caseblock in self.caseblocks:
+            var = caseblock.matchVar.getTarget()
+            for entry in caseblock.entries:
+                if isinstance(entry.pattern, ast.VarTag):
+                    entry.pattern.slotRoot = getattr(var, 'slotRoot', None)
+                    entry.pattern.slot = getattr(var, 'slot', None)
+    def addSlot(self, var):
+        var.slotRoot = self.func
+        var.slot = self.frameSize
+        self.frameSize += 1
+        if len(self.bodies) > 0:
+            self.bodies[-1].declaresVars = True
+    def visitChild(self, node, owner):
+        if isinstance(node, (ast.FuncDef, ast.ClassDef)):
+            # nested definitions get frames of their own
+            return
+        if isinstance(node, ast.SingleVarDef):
+            self.addSlot(node)
+        elif isinstance(node, ast.SwitchCaseStatement) and len(self.bodies) > 0:
+            self.bodies[-1].declaresVars = True
+        elif isinstance(node, ast.Closure):
+            self.closures.append(node)
+        elif isinstance(node, ast.CaseBlock) and isinstance(node.matchVar, ast.Identifier):
+            self.caseblocks.append(node)
+        if isinstance(node, ast.StatementBody):
+            node.declaresVars = False
+            self.bodies.append(node)
+            self.autoVisit(node, self.visitChild)
+            del self.bodies[-1]
+            return
+        self.autoVisit(node, self.visitChild)
+
 class ExprEvaluator(ast.AstVisitor):
     def __init__(self, interpreter):
         self.interpreter = interpreter
@@ -186,6 +250,9 @@ class NilValue(ast.SimpleNode):
     def evaluateAttr(self, visitor, attr):
         assert False, ('NilValue.evaluateAttr', self, visitor, attr)
 
+# receiver classes remembered per attribute site before the site is treated as megamorphic
+maxInlineCacheSize = 4
+
 class Interpreter(ast.AstVisitor):
     def __init__(self):
         self.name = 'interpreter'
@@ -198,6 +265,13 @@ class Interpreter(ast.AstVisitor):
         self.assign_ops ={'+=':operator.iadd, '-=':operator.isub, '=':self.op_assign}
         self.implicit_args_stack = []
         self.nilValue = NilValue()
+        self.slotAllocator = LocalSlotAllocator()
+        # (owner, code text) -> resolved expression of evaluated EmbeddedCode
+        self.embeddedCodeCache = {}
+        # optional ClosureCompiler which evaluates function bodies as compiled closures
+        self.compiler = None
+        # optional profiler.FuncProfiler timing the gml functions and closures
+        self.profiler = None
         self.logger = xutils.createLogger('Interpreter')
     def op_assign(self, var, val):
         return val
@@ -218,27 +292,33 @@ class Interpreter(ast.AstVisitor):
         return self.getCurrentStack().addVar(name, val)
     def getVar(self, name):
         return self.getCurrentStack().getVar(name)
+    def addLocal(self, var, val):
+        return self.getCurrentStack().addLocal(var, val)
+    def getLocal(self, var, name):
+        return self.getCurrentStack().getLocal(var, name)
     def getCurrentStack(self):
-        return self.stacks[0]
+        return self.stacks[-1]
     def pushStack(self, f, args, this, env):
         # self.logger.debug('pushStack', f, args, this, len(self.stacks))
+        if f.slotRoot is None and isinstance(f, ast.FuncDef):
+            self.slotAllocator.allocate(f)
         stack = EvaluatorStack(f, args, this, env, self.nilValue)
-        self.stacks.insert(0, stack)
+        self.stacks.append(stack)
         return stack
     def popStack(self):
         # self.logger.debug('popStack', len(self.stacks))
-        del self.stacks[0]
+        self.stacks.pop()
     def popScope(self):
-        del self.getCurrentStack().scopes[0]
+        self.getCurrentStack().scopes.pop()
     def pushScope(self):
         scope = EvaluatorScope()
-        self.getCurrentStack().scopes.insert(0, scope)
+        self.getCurrentStack().scopes.append(scope)
         # self.logger.debug('pushScope', scope, self.getCurrentStack().scopes)
         return scope
     def printStack(self):
         self.logger.error('printStack', len(self.stacks))
         i = 0
-        for stack in self.stacks[::-1]:
+        for stack in self.stacks:
             funcname = stack.func.shortname()
             self.logger.error('stack', i, funcname, stack.args, stack.this, stack.unit)
             i += 1
@@ -293,10 +373,14 @@ class Interpreter(ast.AstVisitor):
         assert False, expreval
     def evaluate_EmbeddedCode(self, ec):
         text = ec.code.visit(self)
-        expr = parser.exprParser.parse(text)
-        # self.logger.debug('evaluate_EmbeddedCode', ec, text, expr)
-        expr.setOwner(ec.getOwner())
-        self.project.visitNewItem(expr)
+        key = (ec.getOwner(), text)
+        expr = self.embeddedCodeCache.get(key)
+        if expr is None:
+            expr = parser.exprParser.parse(text)
+            # self.logger.debug('evaluate_EmbeddedCode', ec, text, expr)
+            expr.setOwner(ec.getOwner())
+            self.project.visitNewItem(expr)
+            self.embeddedCodeCache[key] = expr
         ret = expr.visit(self)
         # self.logger.debug('evaluate_EmbeddedCode ret', ec, text, expr, ret)
         return ret
@@ -337,7 +421,10 @@ class Interpreter(ast.AstVisitor):
             return f.cls.singleton_instance
         # assert len(f.spec.params) == 1
         assert self.getCurrentStack().flowFlag == FlowFlags.NORMAL
-        f.body.visit(self)
+        if self.compiler:
+            self.compiler.getBody(f.body)()
+        else:
+            f.body.visit(self)
         return self.getCurrentStack().returnValue
     def createVar(self, var):
         # self.logger.debug('createVar', var, var.initial, self.getThis(), var.getOwnerFunc(), var.getOwnerClass())
@@ -380,14 +467,14 @@ class Interpreter(ast.AstVisitor):
     def evaluate_SingleVarDef(self, var):
         # self.logger.debug('evaluate_SingleVarDef', var)
         val = self.createVar(var)
-        self.addVar(var.name, val)
+        self.addLocal(var, val)
         # self.logger.debug('evaluate_SingleVarDef', var, val)
         return val
     def evaluate_TupleVarDef(self, var):
         # self.logger.debug('evaluate_SingleVarDef', var)
         vals = self.createTupleVar(var)
         for val in vals:
-            self.addVar(val.var.name, val)
+            self.addLocal(val.var, val)
         # self.logger.debug('evaluate_SingleVarDef', var, val)
         return vals
     def evalStatementBlock(self, stmtblock):
@@ -413,43 +500,51 @@ class Interpreter(ast.AstVisitor):
         return False
     def evaluate_ForStatement(self, stmt):
         # self.logger.debug('evaluate_ForStatement', stmt, len(stmt.stmtblock.statements), stmt.inits)
-        scope = self.pushScope()
         if stmt.init:
+            self.pushScope()
             stmt.init.visit(self)
+        declaresVars = stmt.body.declaresVars
         while stmt.condition is None or stmt.condition.visit(self):
-            self.pushScope()
+            if declaresVars:
+                self.pushScope()
             stmt.body.visit(self)
             needAbort = self.checkFlowAbort()
             if needAbort:
-                self.popScope()
+                if declaresVars:
+                    self.popScope()
                 break
             if stmt.step:
                 stmt.step.visit(self)
-            self.popScope()
+            if declaresVars:
+                self.popScope()
         # assert False, (self, stmt)
-        self.popScope()
+        if stmt.init:
+            self.popScope()
     def evaluate_ForEachStatement(self, stmt):
         # self.logger.debug('evaluate_ForEachStatement', stmt, stmt.collection, len(stmt.body.statements))
-        scope = self.pushScope()
-        stmt.item.visit(self)
+        self.pushScope()
+        itemvar = stmt.item.visit(self)
         coll = stmt.collection.visit(self)
         # self.logger.debug('evaluate_ForEachStatement coll', coll, stmt.item)
+        declaresVars = stmt.body.declaresVars
         for item in coll:
-            self.pushScope()
-            scope.setValue(stmt.item.name, item)
+            if declaresVars:
+                self.pushScope()
+            itemvar.setValue(item)
             # self.logger.debug('evaluate_ForEachStatement item', item, stmt.item.name)
             stmt.body.visit(self)
-            self.popScope()
+            if declaresVars:
+                self.popScope()
         self.popScope()
     def evaluate_ForEachDictStatement(self, stmt):
         # self.logger.debug('evaluate_ForEachDictStatement', stmt, stmt.collection, len(stmt.body.statements))
-        scope = self.pushScope()
-        stmt.key.visit(self)
-        stmt.value.visit(self)
+        self.pushScope()
+        keyvar = stmt.key.visit(self)
+        valvar = stmt.value.visit(self)
         coll = stmt.collection.visit(self)
         for key, val in coll.iteritems():
-            scope.setValue(stmt.key.name, key)
-            scope.setValue(stmt.value.name, val)
+            keyvar.setValue(key)
+            valvar.setValue(val)
             # self.logger.debug('evaluate_ForEachDictStatement item', key, val, stmt.key.name, stmt.value.name)
             stmt.body.visit(self)
         self.popScope()
@@ -463,7 +558,7 @@ class Interpreter(ast.AstVisitor):
         return self.implicit_args_stack[0][param.sequence]
     def evaluateVar_Identifier(self, identifier):
         # self.logger.debug('evaluateVar_Identifier', identifier, self)
-        return self.getVar(identifier.name)
+        return self.getLocal(identifier.getTarget(), identifier.name)
     def evaluateVar_AttrRef(self, attr):
         # self.logger.debug('evaluateVar_AttrRef', attr, self)
         obj = attr.object.visit(self)
@@ -534,7 +629,28 @@ class Interpreter(ast.AstVisitor):
         # self.logger.debug('evaluate_AttrRef', attr, attr.object, attr.ref, attr.getOwnerFunc())
         obj = attr.object.visit(self)
         # # self.logger.debug('evaluate_AttrRef obj', attr, attr.object, obj, attr.getOwnerFunc())
+        return self.evaluateAttrOf(obj, attr)
+    def evaluateAttrOf(self, obj, attr):
+        if type(obj) is ClassDefEvaluator:
+            member = self.findCachedMember(attr, obj)
+            if isinstance(member, ast.FuncDef):
+                return FuncDefEvaluator(member, obj)
+            if member is not None:
+                return obj.vars[attr.ref].getValue()
         return obj.evaluateAttr(self, attr)
+    def findCachedMember(self, attr, clsvar):
+        # inline cache of the attribute site, keyed by the receiver class
+        cache = attr.inlineCache
+        if cache is None:
+            cache = attr.inlineCache = {}
+        else:
+            member = cache.get(clsvar.cls, cache)
+            if member is not cache:
+                return member
+        member = clsvar.layout.findMember(attr.ref)
+        if len(cache) < maxInlineCacheSize:
+            cache[clsvar.cls] = member
+        return member
     def evaluate_TypeCast(self, typecast):
         src = typecast.source.visit(self)
         if src is None or src == self.nilValue:
@@ -608,7 +724,10 @@ class Interpreter(ast.AstVisitor):
         # self.logger.debug('evaluate_Closure', c)
         # assert False, (c, c.owner, c.getOwnerFunc())
         assert c.stack, ('evaluate_Closure nil stack', c, c.owner, c.getOwnerFunc())
-        ret = c.body.visit(self)
+        if self.compiler:
+            self.compiler.getBody(c.body)()
+        else:
+            c.body.visit(self)
         return self.getCurrentStack().returnValue
     def evaluate_Call(self, callinfo):
         # self.logger.debug('evaluate_Call', callinfo, callinfo.owner, callinfo.getOwnerFunc(), callinfo.getOwnerClass())
@@ -625,7 +744,14 @@ class Interpreter(ast.AstVisitor):
         stack = self.pushStack(closure, args, None, closure.stack)
         scope = self.pushScope()
         self.implicit_args_stack.insert(0, args)
-        ret = closure.visit(self)
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.enter(closure)
+        try:
+            ret = closure.visit(self)
+        finally:
+            if profiler is not None:
+                profiler.leave()
         del self.implicit_args_stack[0]
         self.popScope()
         self.popStack()
@@ -636,7 +762,15 @@ class Interpreter(ast.AstVisitor):
         if isinstance(target, (ast.FuncDef, ast.FuncProto)):
             if (not target.spec.static) or target.injection_cls:
                 # self.logger.debug('evaluateCall_AttrRef func start', attr, callinfo, attr.getTarget(), target.injection_cls, target.spec.static)
-                caller = callinfo.caller.visit(self)
+                obj = attr.object.visit(self)
+                if type(obj) is ClassDefEvaluator and len(callinfo.namedArgs) == 0:
+                    member = self.findCachedMember(attr, obj)
+                    if isinstance(member, ast.FuncDef) and not member.injection_cls:
+                        # same as FuncDefEvaluator.evaluateCall, which evaluates the object once more
+                        if not member.spec.static and not isinstance(attr.object, (ast.Identifier, ast.This)):
+                            attr.object.visit(self)
+                        return self.callFunc(member, obj, callinfo.args, {})
+                caller = self.evaluateAttrOf(obj, attr)
                 # self.logger.debug('evaluateCall_AttrRef func', attr, callinfo, attr.getTarget(), caller, target.injection_cls)
                 return caller.evaluateCall(self, callinfo)
         if isinstance(target, libs.ScriptFunc) and (not target.spec.static):
@@ -670,11 +804,18 @@ class Interpreter(ast.AstVisitor):
         # self.logger.debug('evalFunc', func, this, args, named_args, self.getThis(), func.getOwnerClass(), func.getOwnerUnit())
         assert len(args) == len(func.spec.params), (args, func.name, func.spec, this, func.spec.static, func, func.getOwnerClass(), func.getOwnerUnit())
         # assert func.name != 'cacheName', (func, this, args, func.injection_cls)
-        self.prepareEvalFunc(func, args, this)
-        if func.info.type == ast.FuncType.constructor:
-            for var in func.cls.vars:
-                self.constructVar(var)
-        ret = func.visit(self)
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.enter(func)
+        try:
+            self.prepareEvalFunc(func, args, this)
+            if func.info.type == ast.FuncType.constructor:
+                for var in func.cls.vars:
+                    self.constructVar(var)
+            ret = func.visit(self)
+        finally:
+            if profiler is not None:
+                profiler.leave()
         self.popStack()
         # self.logger.debug('evalFunc end', func, this, args, named_args, ret)
         return ret
@@ -687,7 +828,7 @@ class Interpreter(ast.AstVisitor):
             for i in range(len(args)):
                 # self.logger.debug('prepareEvalFunc arg', i, f, args[i], f.spec.params[i])
                 # assert not isinstance(args[i], ast.AstNode) or isinstance(args[i], ClassDefEvaluator), (f, args[i], f.spec.params[i])
-                scope.addVar(f.spec.params[i].name, VarHolder(f.spec.params[i], args[i]))
+                stack.addLocal(f.spec.params[i], VarHolder(f.spec.params[i], args[i]))
         else:
             assert False
     def evaluateCall_FuncDef(self, f, callinfo):
@@ -723,7 +864,7 @@ class Interpreter(ast.AstVisitor):
             assert func, ('evaluateCall_Identifier FuncDef or FuncProto or LibFunc', identifier, identifier.getTarget(), callinfo, self.getThis(), callinfo.getOwnerFunc())
             return func.evaluateCall(self, callinfo)
         # self.logger.debug('evaluateCall_Identifier var func', identifier, target, callinfo, self.getValue(identifier.name))
-        return self.getValue(identifier.name).evaluateCall(self, callinfo)
+        return self.getLocal(target, identifier.name).getValue().evaluateCall(self, callinfo)
     def evaluateListComprehension(self, listcomp, i):
         # self.logger.debug('evaluateListComprehension', listcomp.expr, listcomp.fors[0].source, i)
         if i >= len(listcomp.fors):
@@ -735,7 +876,7 @@ class Interpreter(ast.AstVisitor):
         for item in coll:
             scope = self.pushScope()
             # self.logger.debug('evaluateListComprehension item', coll, i, item, scope, listfor.name)
-            self.addVar(listfor.variable.name, VarHolder(listfor.variable, item))
+            self.addLocal(listfor.variable, VarHolder(listfor.variable, item))
             cond = listfor.condition.visit(self) if listfor.condition else True
             if cond:
                 ret.extend(self.evaluateListComprehension(listcomp, i + 1))
@@ -768,7 +909,7 @@ class Interpreter(ast.AstVisitor):
         # return literal.values
     def getThis(self):
         # self.logger.debug('getThis', self, self.getCurrentStack(), self.stacks)
-        return self.getCurrentStack().this if len(self.stacks) > 0 else None
+        return self.stacks[-1].this if len(self.stacks) > 0 else None
     def evaluate_CaseBlock(self, caseblock):
         assert False, caseblock
     def evaluate_CaseEntryExpr(self, caseexpr):
@@ -787,7 +928,7 @@ class Interpreter(ast.AstVisitor):
                 return target
             assert self.getThis()
             return self.getThis().getValue(target.name)
-        ret =  self.getValue(identifier.name)
+        ret =  self.getLocal(target, identifier.name).getValue()
         # self.logger.debug('evaluate_Identifier ret', ret, identifier, identifier.getTarget(), identifier.getOwner(), identifier.getOwnerFunc(), identifier.getOwner().getOwner(), identifier.getOwner().getOwner().getOwner(), identifier.getOwner().getOwner().getOwner().getOwner())
         return ret
     def evaluate_Nil(self, nil):
@@ -849,13 +990,20 @@ class Interpreter(ast.AstVisitor):
     def set_loop_continue(self):
         # self.logger.debug('set_loop_continue', self)
         self.getCurrentStack().flowFlag = FlowFlags.CONTINUE
-    def matchClasses(self, cls, entries, funcname, argcount):
+    def matchClasses(self, cls, caseblock, funcname, argcount):
         # self.logger.debug('matchClasses start', cls, funcname)
-        matchingDegree, matchingEntry = calcClassFuncMatchingDigree(cls, funcname) if 1 == argcount else (None, None)
+        key = (caseblock, cls)
+        dispatchCache = self.project.dispatchCache
+        if ast.dispatchCounter:
+            ast.dispatchCounter.count(self.opname, 'matchClasses', 'cache hit' if key in dispatchCache else 'cache miss')
+        if key in dispatchCache:
+            return dispatchCache[key]
+        matchingDegree, matchingEntry = self.matchClassFunc(cls, funcname) if 1 == argcount else (None, None)
         if matchingDegree == 0:
             # self.logger.debug('matchClasses exact entry', cls, funcname, matchingEntry, entry)
+            dispatchCache[key] = matchingEntry
             return matchingEntry
-        for entry in entries:
+        for entry in caseblock.entries:
             targetcls = None
             if entry and entry.pattern:
                 targetcls = entry.pattern.getTarget() if isinstance(entry.pattern, ast.Identifier) else entry.pattern.getType().getTypeClass()
@@ -866,8 +1014,36 @@ class Interpreter(ast.AstVisitor):
                 matchingEntry = entry
         if matchingEntry:
             # self.logger.debug('matchClasses found entry', cls, funcname, matchingDegree, matchingEntry)
+            dispatchCache[key] = matchingEntry
             return matchingEntry
         return None
+    def matchClassFunc(self, cls, funcname):
+        key = (funcname, cls)
+        dispatchCache = self.project.dispatchCache
+        if ast.dispatchCounter:
+            ast.dispatchCounter.count(self.opname, 'matchClassFunc', 'cache hit' if key in dispatchCache else 'cache miss')
+        if key not in dispatchCache:
+            dispatchCache[key] = calcClassFuncMatchingDigree(cls, funcname)
+        return dispatchCache[key]
+    def matchCaseEntry(self, site, cls):
+        # the entry with the nearest pattern class, cached per (site, cls) until a new class shows up
+        key = (site, cls)
+        dispatchCache = self.project.dispatchCache
+        matchingEntry = dispatchCache.get(key)
+        if ast.dispatchCounter:
+            ast.dispatchCounter.count(self.opname, 'matchCaseEntry', 'cache miss' if matchingEntry is None else 'cache hit')
+        if matchingEntry is None:
+            matchingDegree = sys.maxint
+            for entry in site.entries:
+                targetcls = entry.pattern.variable.getType().getTarget()
+                degree = calcClassMatchingDigree(cls, targetcls)
+                if degree < matchingDegree:
+                    # self.logger.debug('matchCaseEntry try match entry', matchingDegree, degree, cls, targetcls, site.expr)
+                    matchingDegree = degree
+                    matchingEntry = entry
+            if matchingEntry:
+                dispatchCache[key] = matchingEntry
+        return matchingEntry
     def calcClassMatchingDigree(self, cls, targetcls):
         return calcClassMatchingDigree(cls, targetcls)
     def evaluate_SwitchCaseExpr(self, expr):
@@ -875,19 +1051,11 @@ class Interpreter(ast.AstVisitor):
         if isinstance(expr.entries[0], ast.CaseEntryExpr):
             matchexpr = expr.expr.visit(self)
             # self.logger.debug('evaluate_SwitchCaseExpr CaseEntryExpr', expr.getOwnerFunc(), expr.entries[0], expr.entries[0].pattern, expr.expr, matchexpr)
-            matchingDegree = sys.maxint
-            matchingEntry = None
-            for entry in expr.entries:
-                targetcls = entry.pattern.variable.getType().getTarget()
-                degree = calcClassMatchingDigree(matchexpr.cls, targetcls)
-                if degree < matchingDegree:
-                    # self.logger.debug('evaluate_SwitchCaseExpr try match entry', matchingDegree, degree, matchexpr.cls, targetcls, expr.expr)
-                    matchingDegree = degree
-                    matchingEntry = entry
-            # self.logger.debug('evaluate_SwitchCaseExpr final match', matchingDegree, degree, matchexpr.cls, targetcls, expr.expr, matchingEntry.pattern.variable if matchingEntry else None)
-            assert matchingEntry, (matchingDegree, degree, matchexpr.cls, targetcls, expr.expr, matchingEntry)
-            var = self.getVar(expr.expr.name)
-            self.addVar(matchingEntry.pattern.variable.name, var) 
+            matchingEntry = self.matchCaseEntry(expr, matchexpr.cls)
+            # self.logger.debug('evaluate_SwitchCaseExpr final match', matchexpr.cls, expr.expr, matchingEntry.pattern.variable if matchingEntry else None)
+            assert matchingEntry, (matchexpr.cls, expr.expr, matchingEntry)
+            var = self.getLocal(expr.expr.getTarget(), expr.expr.name)
+            self.addLocal(matchingEntry.pattern.variable, var)
             return matchingEntry.expr.visit(self)
         else:
             assert False, (stmt, stmt.entries[0])
@@ -901,24 +1069,19 @@ class Interpreter(ast.AstVisitor):
         if isinstance(stmt.entries[0], ast.CaseEntryStmt):
             matchexpr = stmt.expr.visit(self)
             # self.logger.debug('evaluate_SwitchCaseStatement CaseEntryStmt', stmt, stmt.entries[0], stmt.entries[0].pattern, stmt.expr, matchexpr)
-            matchingDegree = sys.maxint
-            matchingEntry = None
-            for entry in stmt.entries:
-                targetcls = entry.pattern.variable.getType().getTarget()
-                degree = calcClassMatchingDigree(matchexpr.cls, targetcls)
-                if degree < matchingDegree:
-                    # self.logger.debug('evaluate_SwitchCaseStatement try match entry', matchingDegree, degree, matchexpr.cls, targetcls, stmt.expr)
-                    matchingDegree = degree
-                    matchingEntry = entry
-            # self.logger.debug('evaluate_SwitchCaseStatement final match', matchingDegree, degree, matchexpr.cls, targetcls, stmt.expr)
-            assert matchingEntry, (matchingDegree, degree, matchexpr.cls, targetcls, stmt.expr, matchingEntry, stmt.getOwnerFunc(), stmt.getOwnerClass())
-            var = self.getVar(stmt.expr.name)
-            self.addVar(matchingEntry.pattern.variable.name, var) 
+            matchingEntry = self.matchCaseEntry(stmt, matchexpr.cls)
+            # self.logger.debug('evaluate_SwitchCaseStatement final match', matchexpr.cls, stmt.expr)
+            assert matchingEntry, (matchexpr.cls, stmt.expr, matchingEntry, stmt.getOwnerFunc(), stmt.getOwnerClass())
+            var = self.getLocal(stmt.expr.getTarget(), stmt.expr.name)
+            self.addLocal(matchingEntry.pattern.variable, var)
             matchingEntry.body.visit(self)
         else:
             assert False, (stmt, stmt.entries[0])
     def evaluate_StatementBlock(self, stmtblock):
-        scope = self.pushScope()
+        if not stmtblock.body.declaresVars:
+            stmtblock.body.visit(self)
+            return
+        self.pushScope()
         stmtblock.body.visit(self)
         self.popScope()
     def evaluate_StatementBody(self, stmtbody):
@@ -933,16 +1096,20 @@ class Interpreter(ast.AstVisitor):
     def evaluate_IfStatement(self, stmt):
         # self.logger.debug('evaluate_IfStatement', len(stmt.branches))
         for branch in stmt.branches:
-            scope = self.pushScope()
+            declaresVars = branch.body.declaresVars
+            if declaresVars:
+                self.pushScope()
             cond = branch.condition.visit(self)
             # self.logger.debug('evaluate_IfStatement branch', branch.condition, cond)
             assert cond is not None, ('evaluate_IfStatement', expr, expr.condition, cond)
             if cond and cond != self.nilValue:
                 branch.body.visit(self)
-                self.popScope()
+                if declaresVars:
+                    self.popScope()
                 # self.logger.debug('evaluate_IfStatement branch match ret', branch.condition, cond, branch.body)
                 return
-            self.popScope()
+            if declaresVars:
+                self.popScope()
         # self.logger.debug('evaluate_IfStatement else', len(stmt.branches))
         if stmt.elseBranch:
             stmt.elseBranch.visit(self)
@@ -1015,48 +1182,76 @@ class FuncDefEvaluator(ast.AstNode):
         # assert (visitor.getThis() is not None and not self.func.spec.static) or (visitor.getThis() is None and self.func.spec.static), (visitor.getThis(), self.func)
         return visitor.callFunc(self.func, self.clsvar, callinfo.args, dict(callinfo.namedArgs))
 
+class ClassLayout(object):
+    '''
+    member layout of a class shared by all its instances: the fields created per instance in creation order,
+    the constructor chain and the members found by name, including inherited ones.
+    '''
+    def __init__(self, cls):
+        self.cls = cls
+        self.bases = [getClassLayout(base.getTarget()) for base in cls.bases]
+        self.members = {}
+        self.localVars = {}
+        for var in cls.vars:
+            self.localVars[var.name] = var
+        self.fieldNames = set(self.localVars.keys())
+        # fields of the bases come first, shadowed ones are still initialized but never stored
+        self.fields = []
+        self.constructors = []
+        for base in self.bases:
+            self.fields.extend(base.fields)
+            self.constructors.extend(base.constructors)
+        self.fields.extend(cls.vars)
+        self.constructors.append(cls.constructors[0] if cls.constructors else None)
+        self.storedFields = [(var, self.findMember(var.name) is var) for var in self.fields]
+    def findMember(self, name):
+        # breadth first over the bases, fields before methods of the same class
+        if name in self.members:
+            return self.members[name]
+        member = None
+        layouts = [self]
+        while len(layouts) > 0:
+            layout = layouts.pop(0)
+            member = layout.localVars.get(name)
+            if member:
+                break
+            member = layout.cls.symbols.get(name)
+            if isinstance(member, ast.FuncDef):
+                break
+            assert member is None, (layout.cls, name, member)
+            layouts.extend(layout.bases)
+        self.members[name] = member
+        return member
+
+def getClassLayout(cls):
+    if cls.layout is None:
+        cls.layout = ClassLayout(cls)
+    return cls.layout
+
 class ClassDefEvaluator(ast.AstNode):
     def __init__(self, cls, visitor):
         self.cls = cls
         self.visitor = visitor
+        self.layout = getClassLayout(cls)
         self.vars = {}
-        self.bases = [ClassDefEvaluator(base.getTarget(), visitor) for base in cls.bases]
-        for var in cls.vars:
+        for var, stored in self.layout.storedFields:
             # print('ClassDefEvaluator.add', var.name, var, self.cls)
             innervar = visitor.createVar(var)
             # print('ClassDefEvaluator.add ok', var.name, var, self.cls, innervar)
-            self.vars[var.name] = innervar
+            if stored:
+                self.vars[var.name] = innervar
         # print('ClassDefEvaluator.init', self)
     def __repr__(self):
-        name = self.vars.get('name') 
+        name = self.vars.get('name') if 'name' in self.layout.fieldNames else None
         return 'ClassDefEvaluator:%s%s:%s' % (self.cls.name, '(%s)' % name.getValue() if name else '', ast.formatId(self))
-    def getLocalVar(self, name, clsvar):
-        # assert False, (self, self.cls, name)
-        # print('ClassDefEvaluator.getLocalVar', name, self, self.cls, clsvar, self.vars)
-        obj = self.vars.get(name)
-        if obj:
-            # print('ClassDefEvaluator.getLocalVar var obj', name, self, self.cls, clsvar, obj)
-            return obj
-        obj = self.cls.symbols.get(name)
-        # print('ClassDefEvaluator.getLocalVar found symbol', name, self, self.cls, self.vars, obj)
-        if isinstance(obj, ast.FuncDef):
-            # print('ClassDefEvaluator.getLocalVar found function', name, self, self.cls, self.vars, obj)
-            return FuncDefEvaluator(obj, clsvar or self)
-        assert obj is None, (self, name, clsvar, obj)
-        return None
-    def getVar(self, name, clsvar=None):
-        # print('ClassDefEvaluator.getVar search bases', name, self, self.vars)
-        if clsvar is None:
-            clsvar = self
-        nodes = [self]
-        while len(nodes) > 0:
-            node = nodes.pop(0)
-            ret = node.getLocalVar(name, clsvar)
-            if ret:
-                return ret
-            for base in node.bases:
-                nodes.append(base)
-        return None
+    def getVar(self, name):
+        # print('ClassDefEvaluator.getVar', name, self, self.vars)
+        member = self.layout.findMember(name)
+        if isinstance(member, ast.FuncDef):
+            return FuncDefEvaluator(member, self)
+        if member is None:
+            return None
+        return self.vars[name]
     def getValue(self, name):
         # print('ClassDefEvaluator.getValue', name, self)
         return self.getVar(name).getValue()
@@ -1075,8 +1270,9 @@ class ClassDefEvaluator(ast.AstNode):
         # visitor.logger.debug('ClassDefEvaluator.evaluateAttrVar', attr.ref, self, attr)
         return self.getVar(attr.ref)
     def evalConstructor(self, visitor, args, named_args, topclsvar):
-        # visitor.logger.debug('ClassDefEvaluator.evalConstructor', self, visitor, args, named_args, self.bases)
+        # visitor.logger.debug('ClassDefEvaluator.evalConstructor', self, visitor, args, named_args, self.layout.constructors)
         clsvar = topclsvar if topclsvar else self
-        for b in self.bases:
-            b.evalConstructor(visitor, [], {}, clsvar)
-        visitor.evalFunc(self.cls.constructors[0], clsvar, args, named_args)
+        constructors = self.layout.constructors
+        for i in range(len(constructors) - 1):
+            visitor.evalFunc(constructors[i], clsvar, [], {})
+        visitor.evalFunc(constructors[-1], clsvar, args, named_args)
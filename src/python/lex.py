@@ -1,5 +1,6 @@
 
 import sys
+import hashlib
 import ply.lex
 
 
@@ -30,6 +31,20 @@ class LexLogger(object):
     info = dolog
     debug = dolog
 
+def makeTableName(prefix, module, start):
+    # the table module name carries a hash of the grammar, so stale tables are never picked up
+    sig = hashlib.md5()
+    sig.update(start)
+    sig.update(repr(getattr(module, 'tokens', None)))
+    sig.update(repr(getattr(module, 'precedence', None)))
+    for name in sorted(dir(module)):
+        if name.startswith('p_'):
+            doc = getattr(module, name).__doc__
+            if doc:
+                sig.update(name)
+                sig.update(doc)
+    return '%s_%s_%s' % (prefix, start, sig.hexdigest()[:12])
+
 
 class Lexer:
     keywords = ('trait', 'class', 'import', 'func', 'var', 'package', 'enum','interface', 'typedef', 'const',
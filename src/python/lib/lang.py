@@ -19,7 +19,7 @@ class LibFuncMatch(basetype.LibFunc):
             casevar = callinfo.args[0].visit(visitor)
         assert casevar, (callinfo, callinfo.args, caseblock.entries)
         # visitor.logger.debug('LibFuncMatch.evaluateCall', casevar, casevar.cls, caseblock.entries)
-        entry = visitor.matchClasses(casevar.cls, caseblock.entries, callinfo.getOwnerFunc().name, argcount)
+        entry = visitor.matchClasses(casevar.cls, caseblock, callinfo.getOwnerFunc().name, argcount)
         assert entry, (casevar, caseblock, callinfo)
         # visitor.logger.debug('LibFuncMatch found entry', entry, casevar, casevar.cls, caseblock, callinfo, callinfo.getOwnerFunc())
         return entry.visit(visitor)
@@ -58,7 +58,7 @@ class LibFuncSwitch(basetype.LibFunc):
             casevar = callinfo.args[0].visit(visitor)
         assert casevar, (callinfo, callinfo.args)
         # visitor.logger.debug('LibFuncMatch.evaluateCall', casevar, casevar.cls)
-        entry = visitor.matchClasses(casevar.cls, caseblock.entries, callinfo.getOwnerFunc().name)
+        entry = visitor.matchClasses(casevar.cls, caseblock, callinfo.getOwnerFunc().name, argcount)
         assert entry, (casevar, caseblock, callinfo)
         # visitor.logger.debug('LibFuncMatch found entry', entry, casevar, casevar.cls, caseblock, callinfo, callinfo.getOwnerFunc())
         return entry.visit(visitor)
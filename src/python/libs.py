@@ -15,6 +15,7 @@ import goparser
 import lib
 from itertools import chain
 import time
+import collections
 
 prefix_tag_unit = 'ScriptUnit'
 prefix_tag_class = 'ScriptClass'
@@ -25,6 +26,8 @@ prefix_tag_var = 'ScriptVar'
 prefix_tag_const = 'ScriptConst'
 prefix_tag_definitions = 'ScriptDefinitions'
 
+# gml objects created by GmlAstConstructor per class name, reported by the census
+constructedCounts = collections.Counter()
 
 class GmlAstConstructor(ast.AstVisitor):
     def __init__(self, interpreter, evalmode):
@@ -58,6 +61,7 @@ class GmlAstConstructor(ast.AstVisitor):
         # self.logger.debug('constructAst cls', clsname, creatorname, item)
         cls = self.interpreter.project.pkg.getPackage('gml').findSymbol(clsname)
         assert cls is not None, (cls, clsname, item)
+        constructedCounts[clsname] += 1
         args = []
         named_args = {}
         for var in cls.primaryVars:
@@ -0,0 +1,81 @@
+import os
+import time
+import json
+import resource
+import contextlib
+import ast
+
+def getCpuTime():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def getMaxRss():
+    # kilobytes on linux, bytes on darwin
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def countAstNodes(field):
+    # nodes reachable through the ast fields, for the phases which run no visitor
+    if isinstance(field, ast.AstNode):
+        count = 1
+        for value in field.getAstFieldValues():
+            count += countAstNodes(value)
+        return count
+    if isinstance(field, (list, tuple)):
+        return sum([countAstNodes(x) for x in field])
+    if isinstance(field, dict):
+        return sum([countAstNodes(x) for x in field.itervalues()])
+    return 0
+
+class PhaseMetrics(object):
+    '''
+    wall/cpu time, visited nodes, items created through Project.visitNewItem and peak rss of every pipeline phase
+    and of every unit inside a phase, written as json for the build dashboards.
+    '''
+    def __init__(self):
+        self.project = None
+        # ObjectCensus taken at the end of every phase when set
+        self.census = None
+        self.phases = []
+        self.startTime = time.time()
+    def addPhase(self, name):
+        phase = {'name' : name, 'units' : []}
+        self.phases.append(phase)
+        return phase
+    def addUnit(self, phase, name):
+        unit = {'name' : name}
+        phase['units'].append(unit)
+        return unit
+    @contextlib.contextmanager
+    def measure(self, entry, visitor=None):
+        startTime = time.time()
+        startCpu = getCpuTime()
+        startNodes = visitor.visitedNodes if visitor else 0
+        startItems = self.getItemCount()
+        try:
+            yield entry
+        finally:
+            entry['wall'] = time.time() - startTime
+            entry['cpu'] = getCpuTime() - startCpu
+            entry['nodes'] = visitor.visitedNodes - startNodes if visitor else None
+            entry['items'] = self.getItemCount() - startItems
+            entry['maxrss'] = getMaxRss()
+        # only after a phase which completed, a failing census must not hide the error of the phase
+        if self.census and 'units' in entry:
+            entry['census'] = self.census.take()
+            self.census.dump(entry['name'], entry['census'])
+    def getItemCount(self):
+        return self.project.newItemCount if self.project else 0
+    def getReport(self):
+        return {'wall' : time.time() - self.startTime, 'cpu' : getCpuTime(), 'maxrss' : getMaxRss(), 'phases' : self.phases}
+    def write(self, path):
+        dirname = os.path.dirname(path)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        with open(path, 'w') as f:
+            json.dump(self.getReport(), f, indent=2, sort_keys=True)
+    def dump(self):
+        for phase in self.phases:
+            print('phase %-20s wall=%.3f cpu=%.3f nodes=%s items=%d maxrss=%d' % (phase['name'], phase['wall'], phase['cpu'], phase['nodes'], phase['items'], phase['maxrss']))
+            for unit in phase['units']:
+                marks = ''.join([' ' + mark for mark in ['cached', 'worker'] if unit.get(mark)])
+                print('    unit %-30s wall=%.3f cpu=%.3f nodes=%s items=%d%s' % (unit['name'], unit['wall'], unit['cpu'], unit['nodes'], unit['items'], marks))
@@ -0,0 +1,128 @@
+import os
+import stat
+import time
+import hashlib
+import cPickle
+from cStringIO import StringIO
+import lex
+import ast
+import parser
+import metrics
+
+# ast objects shared by every parsed unit, they are pickled by name to keep their identity
+sharedAstObjects = dict([(name, getattr(ast, name)) for name in dir(ast) if name.startswith('builtin') and name.endswith('Type')])
+
+def calcAstVersion():
+    sig = hashlib.md5(lex.makeTableName('gmlparsetab', parser.codeparser, parser.codeparser.start))
+    for m in [lex, ast, parser]:
+        sig.update(open(os.path.splitext(m.__file__)[0] + '.py').read())
+    return sig.hexdigest()
+
+def dumpUnit(unit):
+    sharedIds = dict([(id(obj), name) for name, obj in sharedAstObjects.iteritems()])
+    buf = StringIO()
+    p = cPickle.Pickler(buf, cPickle.HIGHEST_PROTOCOL)
+    p.persistent_id = lambda obj: sharedIds.get(id(obj))
+    p.dump(unit)
+    return buf.getvalue()
+
+def loadUnit(data):
+    u = cPickle.Unpickler(StringIO(data))
+    u.persistent_load = sharedAstObjects.get
+    return u.load()
+
+def parseUnitData(args):
+    # runs in the worker processes of a parse pool, the unit is sent back serialized with the time the parse took
+    filename, text = args
+    startTime = time.time()
+    startCpu = metrics.getCpuTime()
+    try:
+        unit = parser.codeparser.parse(text, filename)
+    except SystemExit as e:
+        # p_error exits, a worker dying that way leaves pool.map waiting forever
+        raise Exception('parse failed', filename, e.code)
+    return dumpUnit(unit), time.time() - startTime, metrics.getCpuTime() - startCpu
+
+def getDefaultDirectory():
+    # per user, the cached units are unpickled so the cache must never live in a shared directory like /tmp
+    cachehome = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cachehome, 'gml', 'parsecache')
+
+def prepareDirectory(directory):
+    # creates the directory private to the current user, returns why an existing one can not be used
+    if not os.path.exists(directory):
+        parent = os.path.dirname(os.path.abspath(directory))
+        if not os.path.exists(parent):
+            os.makedirs(parent)
+        os.mkdir(directory, 0700)
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode):
+        return 'not a directory'
+    if st.st_uid != os.getuid():
+        return 'not owned by the current user'
+    if st.st_mode & 022:
+        return 'writable by other users'
+    return None
+
+class ParseCache(object):
+    def __init__(self, directory, maxsize, maxage):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.maxage = maxage
+        self.version = calcAstVersion()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+    def getPath(self, text):
+        key = hashlib.sha1(self.version + text).hexdigest()
+        return os.path.join(self.directory, key + '.ast')
+    def parse(self, p, text, filename):
+        unit = self.lookup(text)
+        if unit is None:
+            unit = p.parse(text, filename)
+            self.store(text, dumpUnit(unit))
+        return unit
+    def lookup(self, text):
+        path = self.getPath(text)
+        try:
+            with open(path, 'rb') as f:
+                unit = loadUnit(f.read())
+            os.utime(path, None)
+        except (IOError, EOFError, cPickle.UnpicklingError, AttributeError, ImportError, KeyError, IndexError), e:
+            # print('ParseCache.lookup failed', path, e)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return unit
+    def store(self, text, data):
+        path = self.getPath(text)
+        tmppath = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmppath, 'wb') as f:
+            f.write(data)
+        os.rename(tmppath, path)
+    def evict(self):
+        now = time.time()
+        entries = []
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            try:
+                st = os.stat(path)
+            except os.error, e:
+                continue
+            if now - st.st_mtime > self.maxage:
+                self.remove(path)
+            else:
+                entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        totalsize = sum([size for mtime, size, path in entries])
+        for mtime, size, path in entries:
+            if totalsize <= self.maxsize:
+                break
+            self.remove(path)
+            totalsize -= size
+    def remove(self, path):
+        try:
+            os.remove(path)
+            self.evicted += 1
+        except os.error, e:
+            pass
@@ -1419,37 +1419,38 @@ class Parser(object):
         traceback.print_stack()
         sys.exit(100)
 
-    def build(self, start='code_unit'):
+    def build(self, start=None):
+        if start is not None:
+            self.start = start
         if self.lexer is None:
             self.lexer = Lexer()
         self.lexer.build()
-        self.parser = ply.yacc.yacc(module=self, optimize=False, tabmodule='gmlparsetab', debugfile='gmlparser.out', debug=True, start=start, errorlog=LexLogger(sys.stderr))#, debuglog=LexLogger(sys.stderr))
-    def __init__(self, lexer=None):
+        tabmodule = makeTableName('gmlparsetab', self, self.start)
+        self.parser = ply.yacc.yacc(module=self, optimize=True, tabmodule=tabmodule, debug=False, start=self.start, errorlog=LexLogger(sys.stderr))#, debuglog=LexLogger(sys.stderr))
+    def __init__(self, lexer=None, start='code_unit'):
         self.lexer = lexer
         self.parser = None
+        self.start = start
     def parse(self, s, sourcename=None):
+        if self.parser is None:
+            self.build()
         self.lexer.lexer.lineno = 0
         self.sourcename = sourcename
         return self.parser.parse(s, lexer=self.lexer.lexer, debug=False, tracking=True)
 
 
+# parsers are built on first use, run this module to prebuild all the tables
 codeparser = Parser()
-codeparser.build()
+exprParser = Parser(start='expr')
+funcProtoParser = Parser(start='function_proto_decl')
+funcSpecParser = Parser(start='function_spec')
+typeParser = Parser(start='type')
+varDefParser = Parser(start='var_def_item')
 
-exprParser = Parser()
-exprParser.build('expr')
-
-funcProtoParser = Parser()
-funcProtoParser.build('function_proto_decl')
-
-funcSpecParser = Parser()
-funcSpecParser.build('function_spec')
-
-typeParser = Parser()
-typeParser.build('type')
-
-varDefParser = Parser()
-varDefParser.build('var_def_item')
+def buildTables():
+    for p in [codeparser, exprParser, funcProtoParser, funcSpecParser, typeParser, varDefParser]:
+        if p.parser is None:
+            p.build()
 
 def parseExpr(s):
     return exprParser.parse(s)
@@ -1462,12 +1463,21 @@ def parseVarDef(s):
     # print('parseCVarDef', s)
     return varDefParser.parse(s)
 
+# prototype text -> parsed FuncProto, kept as a template and never handed out itself
+funcProtoCache = {}
+
+def loadFuncProto(s):
+    proto = funcProtoCache.get(s)
+    if proto is None:
+        proto = funcProtoParser.parse(s)
+        if proto.spec.returnType is None:
+            proto.spec.returnType = ast.makePrimitiveType('void')
+        funcProtoCache[s] = proto
+    return proto
+
 def parseFuncProto(s):
     # print('parseFuncProto', s)
-    proto = funcProtoParser.parse(s)
-    if proto.spec.returnType is None:
-        proto.spec.returnType = ast.makePrimitiveType('void')
-    return proto
+    return loadFuncProto(s).clone()
 
 def parseFuncSpec(s):
     # print('parseFuncSpec', s)
@@ -1475,3 +1485,8 @@ def parseFuncSpec(s):
     if spec.returnType is None:
         spec.returnType = ast.makePrimitiveType('void')
     return spec
+
+if __name__ == '__main__':
+    buildTables()
+    import goparser
+    goparser.buildTables()
@@ -11,13 +11,22 @@ class OwnerInitializer(ast.AstVisitor):
         # self.logger.debug('OwnerInitializer.init')
     def previsit(self, node):
         # self.logger.debug('OwnerInitializer.previsit', node, self)
+        # owners of the whole subtree are set in this single walk
+        self.visitedNodes += 1
         self.autoVisit(node, self.visitChild)
     def visitChild(self, node, owner):
         # self.logger.debug('OwnerInitializer.visitChild', node, owner)
         assert owner
+        if node.__class__ is ast.UserType and node.interned:
+            # shared with other nodes, it was set up already and keeps its owner
+            return
+        self.visitedNodes += 1
         node.setOwner(owner)
         # node.visit(self)
         self.autoVisit(node, self.visitChild)
+    def initializeOwner_AstNode(self, node):
+        # previsit has already walked the subtree, descending again would re-walk it once per ancestor
+        return None
     def visit(self, astree):
         # self.logger.debug('OwnerInitializer.visit', astree.name, self, len(astree.definitions), astree.imports)
         self.ast = astree
@@ -225,39 +234,47 @@ class NameCacher(ast.AstVisitor):
         tag.visitChildren(self)
 
 
+# literal text -> (format text, parsed expressions), the expressions are cloned for every literal using them
+stringLiteralCache = {}
+
 def convert_string_literal(text):
     # process string evaluation
     # print('convert_string_literal', text)
-    pos = text.find('$')
-    if pos >= 0:
-        # check if it's preceded by a backslash
-        if pos == 0 or text[pos-1] != '\\':
-            if pos + 1 < len(text):
-                nexttag = text[pos+1]
-                if nexttag == '{':
-                    endpos = text.find('}', pos+1)
-                    if endpos >= 0:
-                        exprstr = text[pos+2:endpos]
-                        expr = parser.exprParser.parse(exprstr)
-                        newtext = text[:pos] + "%s" + text[endpos+1:]
-                        # print('convert_string_literal brace part', text, exprstr, expr, newtext)
-                        realtext, exprs = convert_string_literal(newtext)
-                        return realtext, [expr] + exprs
-                elif nexttag == '_' or nexttag.isalpha():
-                    idname = nexttag
-                    i = pos + 2
-                    while i < len(text):
-                        ch = text[i]
-                        if ch == '_' or ch.isalpha():
-                            idname += ch
-                        else:
-                            break
-                    # print('convert_string_literal idname', idname, text)
-                    expr = ast.Identifier(idname)
-                    newtext = text[:pos] + "%s" + text[i:]
-                    realtext, exprs = convert_string_literal(newtext)
-                    return realtext, [expr] + exprs
-    return text, []
+    if text not in stringLiteralCache:
+        stringLiteralCache[text] = parse_string_literal(text)
+    realtext, exprs = stringLiteralCache[text]
+    return realtext, [expr.clone() for expr in exprs]
+
+def parse_string_literal(text):
+    parts = []
+    exprs = []
+    start = 0
+    while True:
+        pos = text.find('$', start)
+        # stop at an escaped tag or at anything that does not start an evaluation
+        if pos < 0 or (pos > 0 and text[pos-1] == '\\') or pos + 1 >= len(text):
+            break
+        nexttag = text[pos+1]
+        if nexttag == '{':
+            endpos = text.find('}', pos+1)
+            if endpos < 0:
+                break
+            expr = parser.exprParser.parse(text[pos+2:endpos])
+            end = endpos + 1
+        elif nexttag == '_' or nexttag.isalpha():
+            end = pos + 2
+            while end < len(text) and (text[end] == '_' or text[end].isalpha()):
+                end += 1
+            expr = ast.Identifier(text[pos+1:end])
+        else:
+            break
+        # print('convert_string_literal part', text, text[pos:end], expr)
+        parts.append(text[start:pos])
+        parts.append('%s')
+        exprs.append(expr)
+        start = end
+    parts.append(text[start:])
+    return ''.join(parts), exprs
 
 class NameResolver(ast.AstVisitor):
     def __init__(self):
@@ -342,6 +359,7 @@ class NameResolver(ast.AstVisitor):
             assert b.getTarget()
             # self.logger.debug('resolveName_ClassDef base', cls.name, b)
             b.getTarget().subclasses.append(cls)
+        self.project.classHierarchy.invalidate()
         for d in cls.definitions:
             # self.logger.debug('resolveName_ClassDef def', cls.name, d)
             d.visit(self)
@@ -0,0 +1,162 @@
+import time
+import signal
+import marshal
+import collections
+import ast
+
+class FuncNames(object):
+    '''
+    readable names of gml functions: package path, owning or injected class and function name,
+    closures are numbered inside their enclosing function.
+    '''
+    def __init__(self):
+        self.names = {}
+        # enclosing function or unit -> {closure : number}
+        self.closureNumbers = {}
+    def get(self, func):
+        name = self.names.get(func)
+        if name is None:
+            name = self.getQualifiedName(func)
+            self.names[func] = name
+        return name
+    def getQualifiedName(self, func):
+        if isinstance(func, ast.Closure):
+            owner = func.owner.getOwnerFunc() if func.owner else None
+            ownername = self.get(owner) if owner else '<global>'
+            root = owner or (func.getOwnerUnit() if func.owner else func)
+            return '%s.<closure%d>' % (ownername, self.getClosureNumber(root, func))
+        path = []
+        unit = func.getOwnerUnit() if func.owner else None
+        if unit and unit.pkg and unit.pkg.fullpath:
+            path.append(unit.pkg.fullpath)
+        cls = getattr(func, 'cls', None) or getattr(func, 'injection_cls', None)
+        if cls:
+            path.append(cls.name)
+        path.append(func.name)
+        return '.'.join(path)
+    def getClosureNumber(self, root, closure):
+        # the position in the enclosing function, not the order the closures are first seen in,
+        # so the names are the same in every run and in both profilers
+        numbers = self.closureNumbers.get(root)
+        if numbers is None:
+            numbers = {}
+            self.collectClosures(root, numbers)
+            self.closureNumbers[root] = numbers
+        if closure not in numbers:
+            numbers[closure] = len(numbers) + 1
+        return numbers[closure]
+    def collectClosures(self, field, numbers):
+        # pre-order walk of the ast fields, closures are numbered in source order
+        if isinstance(field, ast.AstNode):
+            if isinstance(field, ast.Closure):
+                numbers[field] = len(numbers) + 1
+            for value in field.getAstFieldValues():
+                self.collectClosures(value, numbers)
+        elif isinstance(field, (list, tuple)):
+            for x in field:
+                self.collectClosures(x, numbers)
+        elif isinstance(field, dict):
+            for x in field.itervalues():
+                self.collectClosures(x, numbers)
+
+class FuncProfiler(object):
+    '''
+    call counts and inclusive/exclusive time of the gml functions and closures run by the interpreter,
+    saved in the marshalled format of cProfile so that pstats and tools/showprof.py can read it.
+    '''
+    def __init__(self, names=None):
+        # key -> [primitive calls, calls, exclusive time, inclusive time, {caller key : [same four]}]
+        self.stats = {}
+        # [key, start time, time spent in callees]
+        self.frames = []
+        # key -> number of activations on the stack, recursive calls count once in inclusive time
+        self.active = {}
+        self.keys = {}
+        self.names = names or FuncNames()
+    def getKey(self, func):
+        key = self.keys.get(func)
+        if key is None:
+            unit = func.getOwnerUnit() if func.owner else None
+            filename = unit.filename if unit and unit.filename else '~'
+            key = (filename, 0, self.names.get(func))
+            self.keys[func] = key
+        return key
+    def enter(self, func):
+        key = self.getKey(func)
+        self.active[key] = self.active.get(key, 0) + 1
+        self.frames.append([key, time.time(), 0.0])
+    def leave(self):
+        key, start, subtime = self.frames.pop()
+        elapsed = time.time() - start
+        active = self.active[key] - 1
+        self.active[key] = active
+        entry = self.stats.get(key)
+        if entry is None:
+            entry = [0, 0, 0.0, 0.0, {}]
+            self.stats[key] = entry
+        self.addCall(entry, elapsed, subtime, active == 0)
+        if self.frames:
+            caller = self.frames[-1]
+            caller[2] += elapsed
+            callerEntry = entry[4].get(caller[0])
+            if callerEntry is None:
+                callerEntry = [0, 0, 0.0, 0.0]
+                entry[4][caller[0]] = callerEntry
+            self.addCall(callerEntry, elapsed, subtime, active == 0)
+    def addCall(self, entry, elapsed, subtime, primitive):
+        entry[1] += 1
+        entry[2] += elapsed - subtime
+        if primitive:
+            entry[0] += 1
+            entry[3] += elapsed
+    def getStats(self):
+        stats = {}
+        for key, (cc, nc, tt, ct, callers) in self.stats.iteritems():
+            # like cProfile the caller entries start with the total call count
+            stats[key] = (cc, nc, tt, ct, dict([(caller, (c[1], c[0], c[2], c[3])) for caller, c in callers.iteritems()]))
+        return stats
+    def write(self, path):
+        with open(path, 'wb') as f:
+            marshal.dump(self.getStats(), f)
+
+class SamplingProfiler(object):
+    '''
+    samples the interpreter's EvaluatorStack frames on a SIGPROF timer and writes the aggregated
+    stacks in the folded format (outermost frame first, frames joined by ';', then the count)
+    read by flamegraph.pl and speedscope.
+    '''
+    def __init__(self, interpreter, interval=0.005, names=None):
+        self.interpreter = interpreter
+        self.interval = interval
+        # tuple of funcs, outermost first -> number of samples
+        self.samples = collections.Counter()
+        self.sampleCount = 0
+        self.emptyCount = 0
+        self.names = names or FuncNames()
+        self.oldHandler = None
+    def start(self):
+        self.oldHandler = signal.signal(signal.SIGPROF, self.sample)
+        # restart interrupted system calls, python 2 file io would raise EINTR otherwise
+        signal.siginterrupt(signal.SIGPROF, False)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.oldHandler or signal.SIG_DFL)
+        self.oldHandler = None
+    def sample(self, signum, frame):
+        # runs between two python bytecodes of the main thread, only the funcs are captured here
+        self.sampleCount += 1
+        stacks = self.interpreter.stacks
+        if not stacks:
+            self.emptyCount += 1
+            return
+        self.samples[tuple([stack.func for stack in stacks])] += 1
+    def getFolded(self):
+        folded = collections.Counter()
+        for funcs, count in self.samples.iteritems():
+            folded[';'.join([self.names.get(func) for func in funcs])] += count
+        return folded
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.getFolded().iteritems()):
+                f.write('%s %d\n' % (stack, count))
@@ -5,19 +5,22 @@ class TreeFunction(ast.ScriptFunction):
         ast.ScriptFunction.__init__(self)
         self.cls = None
         self.inherit = False
+        self.fieldKinds = {}
     def processScript(self, visitor, owner):
         cls = owner.owner
         # visitor.logger.debug('TreeFunction.processScript', cls.name, cls, owner)
         assert isinstance(cls, ast.ClassDef), (cls, owner, self, visitor)
         self.insertTreeFunctions(cls, cls, visitor)
     def insertTreeFunctions(self, cls, basecls, visitor):
-        self.insertInitializeOwner(cls, basecls, visitor)
-        self.insertClone(cls, basecls, visitor)
-        self.insertVisitChildren(cls, basecls, visitor)
-        # self.insertDump(cls, basecls, visitor)
-        # self.insertDumpCode(cls, basecls, visitor)
-        self.insertToString(cls, basecls, visitor)
-        # self.insertToSimpleString(cls, basecls, visitor)
+        # the functions of one class do not look at each other, they are caught up together before the subclasses
+        with visitor.project.deferNewItems():
+            self.insertInitializeOwner(cls, basecls, visitor)
+            self.insertClone(cls, basecls, visitor)
+            self.insertVisitChildren(cls, basecls, visitor)
+            # self.insertDump(cls, basecls, visitor)
+            # self.insertDumpCode(cls, basecls, visitor)
+            self.insertToString(cls, basecls, visitor)
+            # self.insertToSimpleString(cls, basecls, visitor)
         for subcls in cls.subclasses:
             # visitor.logger.debug('TreeFunction.processScript subcls', cls, subcls)
             self.insertTreeFunctions(subcls, basecls, visitor)
@@ -107,7 +110,7 @@ class TreeFunction(ast.ScriptFunction):
         basefunc = basecls.symbols[name]
         if name not in cls.symbols:
             # visitor.logger.debug('insertFunc', name, cls, basecls, cls.primaryVars)
-            stmts = [self.generateFieldExpr(cls, basecls, basefunc, fieldExprGen, visitor, field) for field in cls.primaryVars]
+            stmts = [self.generateFieldExpr(cls, basecls, basefunc, fieldExprGen, visitor, field, self.getFieldKind(basecls, field)) for field in cls.primaryVars]
             stmts = [stmt for stmt in stmts if stmt is not None]
             stmts = stmtsGen(cls, basecls, visitor, stmts)
             func = ast.FuncDef([], name, basefunc.spec.clone(), ast.StatementBody(stmts))
@@ -116,25 +119,48 @@ class TreeFunction(ast.ScriptFunction):
             func.setOwner(cls)
             visitor.visitNewItem(func)
             # visitor.logger.debug('insertFunc visit ok', name, cls, basecls, cls.primaryVars, func, stmts)
-    def generateFieldExpr(self, cls, basecls, basefunc, fieldExprGen, visitor, field):
-        # visitor.logger.debug('generateFieldExpr', basefunc.name, cls, basecls, visitor, field, field.getType(), fieldExprGen)
-        isStatement = basefunc.spec.returnType is None or (isinstance(basefunc.spec.returnType, ast.UserType) and basefunc.spec.returnType.fullpath == 'void')
+    def getFieldKind(self, basecls, field):
+        # (kind, item kinds, whether any child node of basecls is reachable), computed once per field and base class
+        key = (field, basecls)
+        kind = self.fieldKinds.get(key)
+        if kind is None:
+            kind = self.calcFieldKind(basecls, field)
+            self.fieldKinds[key] = kind
+        return kind
+    def calcFieldKind(self, basecls, field):
         vartype = field.getType()
         assert isinstance(vartype, ast.Type), (field, field.name, vartype)
-        assert vartype, (visitor, field)
         if isinstance(vartype, ast.UserType) and vartype.fullpath == 'List':
-            fvar = None
+            itemkind = self.calcFieldKind(basecls, self.createItemVar(field))
+            return ('list', itemkind, itemkind[2])
+        if isinstance(vartype, ast.UserType) and vartype.fullpath == 'Tuple':
+            assert isinstance(field, ast.TupleVarDef), (basecls, field)
+            itemkinds = [self.calcFieldKind(basecls, itemvar) for itemvar in field.vars]
+            return ('tuple', itemkinds, any(itemkind[2] for itemkind in itemkinds))
+        if ast.isSubClass(vartype.getTypeClass(), basecls):
+            return ('node', None, True)
+        return ('value', None, False)
+    def createItemVar(self, field):
+        vartype = field.getType()
+        if isinstance(vartype.genericArgs[0].type, ast.UserType) and vartype.genericArgs[0].type.fullpath == 'Tuple':
+            varnames = [field.name + '_item' + str(i) for i in range(len(vartype.genericArgs[0].type.elementTypes))]
+            fvar = ast.createTupleVarDef(varnames, vartype.genericArgs[0].type.clone(), None)
+            fvar.type.setTarget(vartype.genericArgs[0].type.getTarget())
+        else:
+            fvar = ast.SingleVarDef(field.name + '_item', vartype.genericArgs[0].type.clone(), None)
+            fvar.type.setTarget(vartype.genericArgs[0].type.getTarget())
+        return fvar
+    def generateFieldExpr(self, cls, basecls, basefunc, fieldExprGen, visitor, field, kind):
+        # visitor.logger.debug('generateFieldExpr', basefunc.name, cls, basecls, visitor, field, field.getType(), fieldExprGen)
+        isStatement = basefunc.spec.returnType is None or (isinstance(basefunc.spec.returnType, ast.UserType) and basefunc.spec.returnType.fullpath == 'void')
+        if isStatement and not kind[2] and kind[0] != 'tuple':
+            return None
+        if kind[0] == 'list':
+            fvar = self.createItemVar(field)
             collcopy = ast.Slicing(ast.Identifier(field.name), None, None, None)
             # visitor.logger.debug('generateFieldExpr ListType', basefunc.name, cls, field)
-            if isinstance(vartype.genericArgs[0].type, ast.UserType) and vartype.genericArgs[0].type.fullpath == 'Tuple':
-                varnames = [field.name + '_item' + str(i) for i in range(len(vartype.genericArgs[0].type.elementTypes))]
-                fvar = ast.createTupleVarDef(varnames, vartype.genericArgs[0].type.clone(), None)
-                fvar.type.setTarget(vartype.genericArgs[0].type.getTarget())
-            else:
-                fvar = ast.SingleVarDef(field.name + '_item', vartype.genericArgs[0].type.clone(), None)
-                fvar.type.setTarget(vartype.genericArgs[0].type.getTarget())
             if isStatement:
-                stmts = self.generateFieldExpr(cls, basecls, basefunc, fieldExprGen, visitor, fvar)
+                stmts = self.generateFieldExpr(cls, basecls, basefunc, fieldExprGen, visitor, fvar, kind[1])
                 if stmts is None:
                     # assert basefunc.name != 'visitChildren', (cls, basecls, basefunc, field, isStatement, field.getType())
                     return None
@@ -147,22 +173,20 @@ class TreeFunction(ast.ScriptFunction):
                 listfor = ast.ListComprehensionFor(fvar, collcopy, None)
                 # visitor.logger.debug('generateFieldExpr add ListComprehension', basefunc, cls, field)
                 assert basefunc.name not in ['visitChildren', 'dump', 'dumpCode'], basefunc
-                stmt = ast.ListComprehension(self.generateFieldExpr(cls, basecls, basefunc, fieldExprGen, visitor, fvar), [listfor])
+                stmt = ast.ListComprehension(self.generateFieldExpr(cls, basecls, basefunc, fieldExprGen, visitor, fvar, kind[1]), [listfor])
                 # visitor.logger.debug('generateFieldExpr ListComprehension', basefunc.name, stmt, cls, basecls, basefunc, field, listfor)
                 return stmt
-        if isinstance(vartype, ast.UserType) and vartype.fullpath == 'Tuple':
-            assert isinstance(field, ast.TupleVarDef), (basecls, visitor, field)
-            exprs = [self.generateFieldExpr(cls, basecls, basefunc, fieldExprGen, visitor, itemvar) for itemvar in field.vars]
+        if kind[0] == 'tuple':
+            exprs = [self.generateFieldExpr(cls, basecls, basefunc, fieldExprGen, visitor, itemvar, itemkind) for itemvar, itemkind in zip(field.vars, kind[1])]
             return exprs if isStatement else ast.TupleLiteral(exprs) 
-        varcls = vartype.getTypeClass()
-        if ast.isSubClass(varcls, basecls):
+        if kind[0] == 'node':
             callinfo = fieldExprGen(cls, basecls, basefunc, field)
             if isStatement:
                 stmts = [ast.CallStatement(c) if isinstance(c, ast.Call) else c for c in callinfo] if isinstance(callinfo, list) else ast.CallStatement(callinfo) if isinstance(callinfo, ast.Call) else callinfo
                 # visitor.logger.debug('generateFieldExpr ok', basefunc.name, cls, basecls, visitor, field, stmts)
                 return stmts
             return callinfo
-        # visitor.logger.debug('generateFieldExpr none', basefunc.name, isStatement, vartype, cls, basecls, visitor, field, varcls, ast.isSubClass(varcls, basecls))
+        # visitor.logger.debug('generateFieldExpr none', basefunc.name, isStatement, cls, basecls, visitor, field)
         return None if isStatement else ast.Identifier(field.name)
 
 def loadAll():
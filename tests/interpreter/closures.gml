@@ -0,0 +1,109 @@
+package interptest
+
+class Shape {
+    case Square(side: int)
+    case Rect(width: int, height: int)
+    case Circle(radius: int)
+}
+
+func Shape.area() => int {
+    do match {
+        case Square:
+            return side * side
+        case Rect:
+            return width * height
+        case Circle:
+            return 3 * radius * radius
+    }
+}
+
+func describe(shape: Shape) => string {
+    do match shape {
+        case Square:
+            return "square"
+        case Rect:
+            return "rect"
+        case Circle:
+            return "circle"
+    }
+}
+
+class Counter {
+    var count: int
+    func add(n: int) {
+        count += n
+    }
+}
+
+func apply(values: [int], f: func (int) => int) => [int] {
+    var result: [int]
+    for v in values {
+        result.append(f(v))
+    }
+    return result
+}
+
+class Animal {
+    var name: string
+    func sound() => string {
+        return "..."
+    }
+    func speak() => string {
+        return name + " says " + sound()
+    }
+}
+
+class Dog: Animal {
+    func sound() => string {
+        return "woof"
+    }
+}
+
+func fib(n: int) => int {
+    if n < 2 {
+        return n
+    }
+    return fib(n - 1) + fib(n - 2)
+}
+
+func runMain(args: [string]) {
+    var shapes: [Shape] = [Square(side=3), Rect(width=2, height=5), Circle(radius=2)]
+    for shape in shapes {
+        println("check shape", describe(shape), shape.area())
+    }
+    var offset = 10
+    println("check apply", apply([1, 2, 3], {return $0 + offset}))
+    var counter = Counter()
+    shapes.each({counter.add($0.area())})
+    println("check counter", counter.count)
+    var total = 0
+    var last = 0
+    for i in [1, 2, 3, 4, 5, 6, 7, 8, 9, 10] {
+        last = i
+        if i % 2 == 1 and i < 8 {
+            total += i
+        }
+    }
+    println("check loop", total, last)
+    var squares = [x * x for x in [1, 2, 3, 4]]
+    println("check comprehension", squares)
+    var names: {string: int}
+    names["a"] = 1
+    names["b"] = 2
+    println("check dict", names["a"] + names["b"], "a" in names, "c" in names)
+    println("check fib", fib(15))
+    println("check chained", apply(apply([1, 2], {return $0 * offset}), {return fib($0 / 10) + $0}))
+    var nested: [int]
+    [1, 2].each({
+        var outer = $0
+        [10, 20].each({nested.append(outer * $0 + offset)})
+    })
+    println("check nested", nested)
+    var animals: [Animal] = [Animal(name="cat"), Dog(name="rex")]
+    println("check speak", [a.speak() for a in animals])
+    var letters = ["a", "b", "c", "d"]
+    letters[1] = "x"
+    println("check slice", letters[1:3], letters.size())
+    println("check ifelse", "big" if total > 10 else "small")
+    println("check format", "%s-%d" % ("x", 42))
+}
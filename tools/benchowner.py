@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../src/python'))
+import ast
+import parser
+from preprocessor import OwnerInitializer
+
+# usage: python tools/benchowner.py [depth]
+depth = 200
+if len(sys.argv) >= 2:
+    depth = int(sys.argv[1])
+
+class RewalkingOwnerInitializer(OwnerInitializer):
+    # the previous behaviour: previsit walks the subtree again for every node reached by visitDefault
+    def initializeOwner_AstNode(self, node):
+        return ast.passthrough
+
+def makeNestedUnit(depth):
+    lines = ['package bench', '', 'func nested(a : int) => int {']
+    for i in range(depth):
+        lines.append('    ' * (i + 1) + 'if a > %d {' % i)
+    lines.append('    ' * (depth + 1) + 'return ' + '(a + ' * depth + '1' + ')' * depth)
+    for i in reversed(range(depth)):
+        lines.append('    ' * (i + 1) + '}')
+    lines.append('    return 0')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+def countNodes(visitor, unit):
+    count = [0]
+    def countChild(node, owner):
+        count[0] += 1
+        visitor.autoVisit(node, countChild)
+    visitor.autoVisit(unit, countChild)
+    return count[0]
+
+def bench(visitorcls, text):
+    unit = parser.codeparser.parse(text, 'nested.gml')
+    visitor = visitorcls()
+    calls = [0]
+    setOwner = ast.AstSimpleContext.setOwner
+    def countingSetOwner(node, owner):
+        calls[0] += 1
+        setOwner(node, owner)
+    ast.AstSimpleContext.setOwner = countingSetOwner
+    try:
+        startTime = time.time()
+        visitor.visit(unit)
+        usedTime = time.time() - startTime
+    finally:
+        ast.AstSimpleContext.setOwner = setOwner
+    return countNodes(visitor, unit), calls[0], usedTime
+
+sys.setrecursionlimit(100000)
+text = makeNestedUnit(depth)
+for visitorcls in [RewalkingOwnerInitializer, OwnerInitializer]:
+    nodes, calls, usedTime = bench(visitorcls, text)
+    print('%-28s depth=%d nodes=%d setOwner=%d time=%.3fs' % (visitorcls.__name__, depth, nodes, calls, usedTime))
@@ -0,0 +1,31 @@
+import os
+import sys
+import subprocess
+
+# usage: python tools/checkclosures.py
+# runs tests/interpreter with the tree walking interpreter and with --closures, the "check" lines printed
+# by both runs must match tests/interpreter/closures.expected
+rootdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+testdir = os.path.join(rootdir, 'tests/interpreter')
+expected = open(os.path.join(testdir, 'closures.expected')).read().splitlines()
+
+def runMode(args):
+    cmd = [sys.executable, os.path.join(rootdir, 'src/python/gml.py')] + args + ['--classpath', testdir, '--entry', 'interptest.runMain']
+    output = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT).communicate()[0]
+    return [line for line in output.splitlines() if line.startswith('check ')]
+
+failed = False
+for name, args in [('interpreter', []), ('closures', ['--closures'])]:
+    lines = runMode(args)
+    if lines == expected:
+        print('%s ok, %d checks' % (name, len(lines)))
+        continue
+    failed = True
+    print('%s differs from closures.expected' % name)
+    for i in range(max(len(lines), len(expected))):
+        got = lines[i] if i < len(lines) else '<missing>'
+        want = expected[i] if i < len(expected) else '<missing>'
+        if got != want:
+            print('    expected: %s' % want)
+            print('    got:      %s' % got)
+sys.exit(1 if failed else 0)
@@ -1,8 +1,10 @@
 import pstats
 import sys
+# showprof.py [sort column] [profile], the profile is gml.pyprof written by cProfile or one written by gml.py --gml-profile
 sortColumn = 1
 if len(sys.argv) >= 2:
     sortColumn = int(sys.argv[1])
+filename = sys.argv[2] if len(sys.argv) >= 3 else 'gml.pyprof'
 
-p = pstats.Stats('gml.pyprof')
+p = pstats.Stats(filename)
 p.strip_dirs().sort_stats(sortColumn).print_stats()